@@ -0,0 +1,65 @@
+import contextvars
+import csv
+import io
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+# Sheets/OpenAI 호출 계측. SheetsApi.call과 GPT 호출 래퍼가 호출 1건마다 record()를 부른다.
+# 화면 스크립트 실행(rerun)마다 begin_rerun()으로 번호를 붙이고, 작업 스레드에는 contextvars.copy_context()로 전달한다.
+
+EVENT_FIELDS = ["ts", "rerun", "thread", "service", "op", "sheet", "latency_ms", "wait_ms", "bytes", "status", "retries",
+                "prompt_tokens", "completion_tokens"]
+_current_rerun = contextvars.ContextVar("api_metrics_rerun", default=None)
+
+
+def payload_bytes(obj):
+    # 요청/응답 본문 크기 추정: 값 목록이나 dict처럼 JSON으로 직렬화되는 것만 센다 (Worksheet 객체 등은 0)
+    if not isinstance(obj, (list, tuple, dict, str)): return 0
+    try: return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError): return 0
+
+
+class ApiMetrics:
+    # 프로세스 전체가 공유하는 호출 기록 (스레드 안전). 최근 max_events건만 메모리에 유지한다.
+    def __init__(self, max_events=5000):
+        self.events, self.lock = deque(maxlen=max_events), threading.Lock()
+        self._rerun_ids, self._cache_stats = itertools.count(1), {}
+
+    def begin_rerun(self):
+        rerun_id = next(self._rerun_ids)
+        _current_rerun.set(rerun_id)
+        return rerun_id
+
+    def record(self, service, op, sheet, started, status, retries=0, nbytes=0, wait_sec=0.0, prompt_tokens=0, completion_tokens=0):
+        # started는 time.perf_counter() 값. latency_ms는 할당량 대기(wait_ms)를 포함한 전체 소요 시간.
+        ev = {"ts": time.time(), "rerun": _current_rerun.get(), "thread": threading.current_thread().name,
+              "service": service, "op": op, "sheet": sheet, "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+              "wait_ms": round(wait_sec * 1000, 1), "bytes": nbytes, "status": status, "retries": retries,
+              "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        with self.lock: self.events.append(ev)
+
+    def cache_lookup(self, name):
+        with self.lock: self._cache_stats.setdefault(name, [0, 0])[0] += 1
+
+    def cache_miss(self, name):
+        # st.cache_data 함수 본문 첫 줄에서 호출 (본문은 캐시 미스일 때만 실행된다)
+        with self.lock: self._cache_stats.setdefault(name, [0, 0])[1] += 1
+
+    def cache_hit_rates(self):
+        # {이름: (조회 수, 적중 수)}
+        with self.lock: return {name: (n, max(0, n - miss)) for name, (n, miss) in self._cache_stats.items()}
+
+    def snapshot(self, since=None):
+        with self.lock: return [ev for ev in self.events if since is None or ev["ts"] >= since]
+
+    def to_json(self):
+        return json.dumps({"events": self.snapshot(), "cache": self.cache_hit_rates()}, ensure_ascii=False, indent=1)
+
+    def to_csv(self):
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EVENT_FIELDS)
+        writer.writeheader(); writer.writerows(self.snapshot())
+        return buf.getvalue()
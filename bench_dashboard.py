@@ -0,0 +1,191 @@
+"""교사용 대시보드 지연 시간 벤치마크 (오프라인).
+
+fake_backends의 가짜 Sheets/OpenAI 클라이언트로 teacher_diary_app.py를 streamlit.testing AppTest에서 실행하고
+첫 요약까지 걸린 시간, 탭3 로드 시간, 쪽지 저장 지연 등을 잰다. 실제 자격 증명은 필요 없다.
+process_cold_start는 새 파이썬 프로세스에서 (동기화된 저장소로) 앱 스크립트를 처음 실행하는 시간으로,
+모듈 import 비용이 포함된다.
+
+    python bench_dashboard.py --students 40 --days 365 --latency 0.15
+    python bench_dashboard.py --json bench.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+from functools import partial
+from unittest import mock
+
+from fake_backends import FakeAsyncOpenAI, FakeBackendConfig, FakeGspreadClient, FakeOpenAI
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teacher_diary_app.py")
+
+
+def _clear_streamlit_caches():
+    # 새 프로세스에서 시작한 것처럼: cache_data / cache_resource 모두 비운다
+    import streamlit as st
+    st.cache_data.clear(); st.cache_resource.clear()
+
+
+def _new_session(args, db_path):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    at.secrets["GOOGLE_CREDENTIALS"] = {"type": "service_account"}
+    at.secrets["OPENAI_API_KEY"] = "sk-fake"
+    at.secrets["DIARY_DB_PATH"] = db_path
+    at.secrets["SHEETS_READ_QUOTA_PER_MIN"] = args.app_quota
+    at.session_state["teacher_logged_in"] = True
+    return at
+
+
+def _timed(fn):
+    t0 = time.perf_counter(); fn(); return time.perf_counter() - t0
+
+
+def _check(at, label):
+    if at.exception: raise RuntimeError(f"{label}: {at.exception[0].value}")
+
+
+def _cold_start_argv(args, db_path):
+    return [sys.executable, os.path.abspath(__file__), "--students", str(args.students), "--days", str(args.days),
+            "--workbooks", str(args.workbooks), "--seed", str(args.seed), "--latency", str(args.latency), "--jitter", str(args.jitter),
+            "--app-quota", str(args.app_quota), "--timeout", str(args.timeout), "--cold-start-child", db_path]
+
+
+def cold_start_child(args):
+    # 자식 프로세스: OpenAI는 가짜로 바꾸지 않는다 (mock.patch가 openai를 import하므로). 키만 넣고 실제 호출은 하지 않는다.
+    config = FakeBackendConfig(latency_sec=args.latency, latency_jitter_sec=args.jitter, seed=args.seed)
+    client = FakeGspreadClient(args.students, args.days, config=config, seed=args.seed, workbooks=args.workbooks)
+    with mock.patch("gspread.authorize", return_value=client), \
+         mock.patch("oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_dict", return_value=None):
+        at = _new_session(args, args.cold_start_child)
+        seconds = _timed(at.run); _check(at, "process_cold_start")
+    heavy = [m for m in ("openai", "wordcloud", "matplotlib") if m in sys.modules]
+    print(json.dumps({"seconds": seconds, "calls": client.gate.count(), "heavy_modules": heavy}))
+
+
+def run_benchmarks(args):
+    config = FakeBackendConfig(latency_sec=args.latency, latency_jitter_sec=args.jitter, quota_per_min=args.fake_quota,
+                               error_rate=args.error_rate, seed=args.seed)
+    client = FakeGspreadClient(args.students, args.days, config=config, seed=args.seed, workbooks=args.workbooks)
+    names = [f"학생{i + 1:02d}" for i in range(args.students)]
+    results, api_calls, heavy_modules = {}, {}, set()
+
+    def record(label, seconds, calls_before):
+        results.setdefault(label, []).append(seconds)
+        api_calls.setdefault(label, []).append(client.gate.count() - calls_before)
+
+    with ExitStack() as stack, tempfile.TemporaryDirectory() as tmp:
+        stack.enter_context(mock.patch("gspread.authorize", return_value=client))
+        stack.enter_context(mock.patch("oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_dict", return_value=None))
+        stack.enter_context(mock.patch("openai.OpenAI", partial(FakeOpenAI, latency_sec=args.openai_latency)))
+        stack.enter_context(mock.patch("openai.AsyncOpenAI", partial(FakeAsyncOpenAI, latency_sec=args.openai_latency)))
+
+        for rep in range(args.repeat):
+            db_path = os.path.join(tmp, f"bench-{rep}.sqlite3")
+
+            # 1) 빈 로컬 저장소에서 첫 요약 (최초 실행: 전체 동기화 포함)
+            _clear_streamlit_caches()
+            at, n0 = _new_session(args, db_path), client.gate.count()
+            record("cold_first_summary", _timed(at.run), n0); _check(at, "cold_first_summary")
+
+            # 2) 저장소가 채워진 상태에서 새 프로세스/세션의 첫 요약
+            _clear_streamlit_caches()
+            at, n0 = _new_session(args, db_path), client.gate.count()
+            record("warm_first_summary", _timed(at.run), n0); _check(at, "warm_first_summary")
+
+            # 3) 아무것도 바꾸지 않은 재실행 (위젯 상호작용 1회의 기본 비용)
+            n0 = client.gate.count(); record("idle_rerun", _timed(at.run), n0)
+
+            # 4) 탭3 학생 선택 -> 전체 기록 로드
+            name = names[rep % len(names)]
+            n0 = client.gate.count()
+            record("tab3_load", _timed(lambda: at.selectbox(key="sel_student_tab3_vfinal").select(name).run()), n0); _check(at, "tab3_load")
+
+            # 5) 탭3 날짜 변경
+            ws = client.worksheet_for(name)
+            last_date = ws.rows[-1][0]
+            n0 = client.gate.count()
+            record("tab3_date_change", _timed(lambda: at.date_input(key=f"date_pick_final_{name}").set_value(date.fromisoformat(last_date)).run()), n0)
+            _check(at, "tab3_date_change")
+
+            # 6) 쪽지 저장: 버튼 클릭 후 화면이 돌아올 때까지 / 시트에 실제로 쓰일 때까지
+            note = f"벤치마크 쪽지 {rep}"
+            at.text_area(key=f"note_in_key_{name}_{last_date}").input(note)
+            n0 = client.gate.count(); t0 = time.perf_counter()
+            at.button(key=f"save_note_key_{name}_{last_date}").click().run(); _check(at, "note_save")
+            record("note_save_ui", time.perf_counter() - t0, n0)
+            while ws.rows[-1][4:5] != [note]:
+                if time.perf_counter() - t0 > args.timeout: raise RuntimeError("note_save_flush: 시간 초과")
+                time.sleep(0.02)
+            record("note_save_flushed", time.perf_counter() - t0, n0)
+
+            # 7) 학생마다 새 일기 1건을 추가한 뒤 새로고침 (증분 동기화)
+            new_date = (date.today() + timedelta(days=2 * rep + 1)).strftime("%Y-%m-%d")
+            for n in names: client.worksheet_for(n).append_row([new_date, "😀 긍정 - 기쁨", "벤치마크", "벤치마크", ""])
+            n0 = client.gate.count()
+            record("refresh_sync", _timed(lambda: at.button(key="refresh_data_final_v4").click().run()), n0); _check(at, "refresh_sync")
+            # 8) 한 번 더: 스프레드시트/워크시트 핸들이 캐시된 상태의 증분 동기화
+            new_date = (date.today() + timedelta(days=2 * rep + 2)).strftime("%Y-%m-%d")
+            for n in names: client.worksheet_for(n).append_row([new_date, "😐 보통 - 평온", "벤치마크", "벤치마크", ""])
+            n0 = client.gate.count()
+            record("refresh_sync_again", _timed(lambda: at.button(key="refresh_data_final_v4").click().run()), n0); _check(at, "refresh_sync_again")
+
+            # 9) 새 프로세스에서 첫 화면 (모듈 import 포함, 저장소는 이미 동기화됨)
+            out = subprocess.run(_cold_start_argv(args, db_path), capture_output=True, text=True, check=True, timeout=args.timeout)
+            child = json.loads(out.stdout.strip().splitlines()[-1])
+            results.setdefault("process_cold_start", []).append(child["seconds"])
+            api_calls.setdefault("process_cold_start", []).append(child["calls"])
+            heavy_modules.update(child["heavy_modules"])
+        _clear_streamlit_caches()
+    return results, api_calls, sorted(heavy_modules)
+
+
+def summarize(results, api_calls):
+    rows = []
+    for label, vals in results.items():
+        vals_ms = sorted(v * 1000 for v in vals)
+        p95 = vals_ms[min(len(vals_ms) - 1, int(round(0.95 * (len(vals_ms) - 1))))]
+        rows.append({"metric": label, "n": len(vals_ms), "median_ms": round(statistics.median(vals_ms), 1),
+                     "p95_ms": round(p95, 1), "min_ms": round(vals_ms[0], 1), "sheets_calls": round(statistics.mean(api_calls[label]), 1)})
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--students", type=int, default=40)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--workbooks", type=int, default=0, help="0이면 학생별 스프레드시트, N이면 학생들을 N개의 통합 문서에 나눠 담는다")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0.15, help="가짜 Sheets 호출 1건당 지연(초)")
+    p.add_argument("--jitter", type=float, default=0.05, help="호출 지연에 더할 무작위 지연 상한(초)")
+    p.add_argument("--openai-latency", type=float, default=0.0)
+    p.add_argument("--fake-quota", type=int, default=None, help="가짜 백엔드의 분당 호출 한도 (넘으면 429)")
+    p.add_argument("--app-quota", type=int, default=300, help="앱의 SHEETS_READ_QUOTA_PER_MIN")
+    p.add_argument("--error-rate", type=float, default=0.0, help="무작위 503 비율")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--timeout", type=float, default=600)
+    p.add_argument("--json", help="결과를 JSON 파일로 저장")
+    p.add_argument("--cold-start-child", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.cold_start_child: return cold_start_child(args)
+
+    results, api_calls, heavy_modules = run_benchmarks(args)
+    rows = summarize(results, api_calls)
+    print(f"students={args.students} days={args.days} workbooks={args.workbooks} latency={args.latency}s repeat={args.repeat}")
+    print(f"{'metric':<22}{'median_ms':>12}{'p95_ms':>12}{'min_ms':>12}{'sheets_calls':>14}")
+    for r in rows:
+        print(f"{r['metric']:<22}{r['median_ms']:>12}{r['p95_ms']:>12}{r['min_ms']:>12}{r['sheets_calls']:>14}")
+    print(f"process_cold_start 후 로드된 무거운 모듈: {', '.join(heavy_modules) or '없음'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": rows, "cold_start_heavy_modules": heavy_modules}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from diary_store import EMOTION_GROUPS
+
+# 학급 감정 추이: (student, date, emotion_group) 긴 표 하나를 Parquet으로 저장해 두고 기간 집계는 모두 벡터 연산으로 한다.
+UNCLASSIFIED = "감정 미분류"
+TREND_GROUPS = EMOTION_GROUPS + [UNCLASSIFIED]
+NEGATIVE_GROUP = EMOTION_GROUPS[2]
+STAMP_KEY = b"diary_content_stamp"
+
+
+def build_emotion_frame(raw):
+    # raw: DiaryStore.emotion_rows(). 같은 날짜에 여러 건이면 가장 나중 행만 남기고(화면의 primary와 같음), 날짜 형식이 틀린 행은 뺀다.
+    df = raw.drop_duplicates(["student", "date"], keep="last")
+    dates = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    df = pd.DataFrame({"student": df["student"].astype("category"), "date": dates,
+                       "emotion_group": pd.Categorical(df["emotion_group"].fillna(UNCLASSIFIED), categories=TREND_GROUPS)})
+    return df.dropna(subset=["date"]).sort_values(["date", "student"]).reset_index(drop=True)
+
+
+def load_emotion_frame(store, path):
+    # 저장소 내용 스탬프가 파일 메타데이터와 같으면 Parquet을 그대로 읽고, 다르면 SQLite에서 다시 만들어 저장한다.
+    stamp = store.content_stamp()
+    if os.path.exists(path):
+        try:
+            if (pq.read_schema(path).metadata or {}).get(STAMP_KEY, b"").decode() == stamp: return pd.read_parquet(path)
+        except (OSError, pa.ArrowException): pass  # 깨진 파일은 다시 만든다
+    df = build_emotion_frame(store.emotion_rows())
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), STAMP_KEY: stamp.encode()})
+    # 여러 프로세스/스레드가 동시에 다시 만들 수 있으므로 임시 파일 이름은 매번 다르게 하고 같은 폴더에서 os.replace로 바꿔 넣는다
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        pq.write_table(table, tmp_path); os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    return df
+
+
+def negative_runs(sel, min_days):
+    # 학생마다 제출한 일기를 날짜순으로 볼 때 '부정'이 min_days번 이상 이어진 구간 (미제출일은 건너뛴다).
+    # 구간이 그 학생의 기간 내 마지막 일기에서 끝나면 '진행 중'.
+    d = sel.sort_values(["student", "date"])
+    d = d.assign(student=d["student"].astype(str))
+    d["is_last"] = d["date"].eq(d.groupby("student")["date"].transform("max"))
+    neg = d["emotion_group"].eq(NEGATIVE_GROUP)
+    run_id = (neg.ne(neg.shift()) | d["student"].ne(d["student"].shift())).cumsum()
+    runs = (d[neg].groupby(run_id[neg])
+            .agg(학생=("student", "first"), 시작=("date", "min"), 끝=("date", "max"), 일수=("date", "size"), 진행_중=("is_last", "last")))
+    runs = runs[runs["일수"] >= min_days].rename(columns={"진행_중": "진행 중"})
+    return runs.sort_values(["진행 중", "일수", "끝"], ascending=False).reset_index(drop=True)
+
+
+def class_trends(df, start, end, n_students, skip_weekends=False, min_neg_days=3):
+    # 기간 [start, end]의 일별/주별 감정 분포, 일별 제출률, 부정 연속 구간
+    days = pd.date_range(start, end, freq="D")
+    if skip_weekends: days = days[days.dayofweek < 5]
+    sel = df[df["date"].between(pd.Timestamp(start), pd.Timestamp(end))]
+    if skip_weekends: sel = sel[sel["date"].dt.dayofweek < 5]
+    daily = (sel.groupby(["date", "emotion_group"], observed=False).size().unstack("emotion_group")
+             .reindex(index=days, columns=TREND_GROUPS, fill_value=0).fillna(0).astype("int64"))
+    daily.index.name, daily.columns.name = "날짜", None
+    weekly = daily.groupby(daily.index.to_period("W-SUN").start_time).sum()
+    weekly.index.name = "주 시작일"
+    weekly_share = weekly.div(weekly.sum(axis=1).where(lambda s: s > 0), axis=0).fillna(0.0)
+    submission = (daily.sum(axis=1) / n_students).rename("제출률") if n_students else pd.Series(0.0, index=days, name="제출률")
+    return {"daily": daily, "weekly": weekly, "weekly_share": weekly_share, "submission": submission,
+            "neg_runs": negative_runs(sel, min_neg_days), "n_entries": len(sel)}
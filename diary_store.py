@@ -0,0 +1,582 @@
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+# 감정 문자열("😀 긍정 - 기쁨")의 대분류. 저장 시점에 한 번만 파싱해 emotion_group 열에 넣는다.
+EMOTION_GROUPS = ["😀 긍정", "😐 보통", "😢 부정"]
+# 시트 헤더 -> 저장소 열 이름
+ENTRY_COLUMNS = {"날짜": "date", "감정": "emotion", "감사한 일": "gratitude", "하고 싶은 말": "message", "선생님 쪽지": "note"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    name TEXT PRIMARY KEY,
+    sheet_url TEXT,
+    worksheet TEXT,         -- 통합 문서 안의 워크시트 이름. NULL이면 학생 전용 스프레드시트의 첫 번째 시트
+    position INTEGER,
+    header TEXT,            -- 마지막으로 읽은 2행 헤더 (JSON)
+    n_rows INTEGER DEFAULT 0,  -- 동기화 커서: 지금까지 읽은 시트 행 수
+    last_row TEXT,          -- 커서 위치 행의 값 (JSON, 변경 감지용)
+    synced_at REAL,
+    full_synced_at REAL,
+    sync_error TEXT,
+    version INTEGER DEFAULT 0,
+    term_rules TEXT         -- term_freq가 이 추출 규칙 버전으로 모든 행을 센 상태이면 그 버전. 다르거나 NULL이면 다시 센다
+);
+CREATE TABLE IF NOT EXISTS entries (
+    student TEXT NOT NULL,
+    row_num INTEGER NOT NULL,
+    date TEXT,
+    emotion TEXT,
+    emotion_group TEXT,
+    gratitude TEXT,
+    message TEXT,
+    note TEXT,
+    PRIMARY KEY (student, row_num)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_student_date ON entries(student, date);
+CREATE INDEX IF NOT EXISTS idx_entries_date ON entries(date);
+CREATE INDEX IF NOT EXISTS idx_entries_group ON entries(emotion_group, date);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+-- 시트에 아직 쓰지 않은 선생님 쪽지. 같은 (학생, 행)에 다시 쓰면 한 건으로 합쳐진다.
+CREATE TABLE IF NOT EXISTS note_queue (
+    student TEXT NOT NULL,
+    row_num INTEGER NOT NULL,
+    sheet_url TEXT,
+    worksheet TEXT,
+    note TEXT,
+    status TEXT,            -- pending / flushing / flushed / failed
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    queued_at REAL,
+    next_try_at REAL,
+    flushed_at REAL,
+    PRIMARY KEY (student, row_num)
+);
+-- 학생별 단어 빈도 ('감사한 일' + '하고 싶은 말'). 새 행이 들어올 때마다 더해 간다.
+CREATE TABLE IF NOT EXISTS term_freq (
+    student TEXT NOT NULL,
+    term TEXT NOT NULL,
+    count INTEGER,
+    PRIMARY KEY (student, term)
+);
+-- GPT 누적 분석 리포트. key = sha256(모델, 프롬프트 버전, 모드, 전달한 기록 데이터)
+CREATE TABLE IF NOT EXISTS gpt_reports (
+    key TEXT PRIMARY KEY,
+    student TEXT,
+    model TEXT,
+    prompt_version TEXT,
+    mode TEXT,
+    report TEXT,
+    created_at REAL,
+    through_row INTEGER     -- 리포트에 포함된 마지막 시트 행
+);
+CREATE INDEX IF NOT EXISTS idx_gpt_reports_student ON gpt_reports(student, created_at);
+-- 증분 분석용 누적 요약: through_row 행까지의 기록을 digest 하나로 요약해 둔다
+CREATE TABLE IF NOT EXISTS gpt_digests (
+    student TEXT PRIMARY KEY,
+    through_row INTEGER,
+    through_date TEXT,
+    source_hash TEXT,       -- 요약에 쓴 기록 데이터의 해시 (이전 행이 바뀌면 처음부터 다시 요약)
+    digest TEXT,
+    model TEXT,
+    prompt_version TEXT,
+    updated_at REAL
+);
+-- 학급 전체 GPT 분석 작업. 항목별 상태를 저장해 두어 세션이 다시 열리거나 프로세스가 재시작돼도 이어서 실행한다.
+CREATE TABLE IF NOT EXISTS gpt_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    incremental INTEGER,
+    status TEXT,            -- running / stopped / done
+    created_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS gpt_job_items (
+    job_id INTEGER,
+    student TEXT,
+    status TEXT,            -- pending / done / failed
+    report_key TEXT,
+    error TEXT,
+    finished_at REAL,
+    PRIMARY KEY (job_id, student)
+);
+"""
+# 이전 버전 DB에 없는 열: (테이블, 열, 타입)
+MIGRATIONS = [("gpt_reports", "through_row", "INTEGER"), ("students", "worksheet", "TEXT"), ("note_queue", "worksheet", "TEXT"),
+              ("students", "term_rules", "TEXT")]
+
+# 워드클라우드용 한국어 단어 추출: 형태소 분석기 없이 흔한 조사/어미를 떼고 불용어를 뺀다.
+TERM_RULES_VERSION = "2"  # 규칙을 바꾸면 올린다. 학생별 term_rules가 다르면 그 학생의 단어 빈도를 처음 볼 때 다시 센다.
+TERM_RE = re.compile(r"[가-힣]+|[A-Za-z]+")
+KO_PARTICLES = ("에서는", "에게서", "으로는", "이랑", "에서", "에게", "한테", "으로", "까지", "부터", "보다", "처럼", "이나", "하고")
+KO_ENDINGS = ("했습니다", "했는데", "했어요", "었어요", "았어요", "합니다", "습니다", "했다", "해서", "해요", "돼요", "하는", "하게", "했던",
+              "어요", "아요", "었다", "았다", "지만")
+KO_SUFFIXES = sorted(KO_PARTICLES + KO_ENDINGS, key=len, reverse=True)
+KO_PARTICLES_1 = ("은", "는", "이", "가", "을", "를", "에", "의", "도", "만", "와", "과", "랑", "로", "께")
+# 한 글자 조사를 떼면 한 글자만 남는 흔한 명사 (책을 -> 책). 그 밖의 두 글자 단어는 그대로 둔다 (아이, 오이 보호).
+KO_SHORT_NOUNS = {"책", "밥", "잠", "꿈", "집", "옷", "물", "비", "눈", "공", "빵", "차", "돈", "산", "강", "길", "반", "방", "개", "말", "약", "글", "숲", "별", "꽃"}
+KO_STOPWORDS = {
+    "오늘", "어제", "내일", "그리고", "그래서", "그런데", "하지만", "너무", "정말", "진짜", "아주", "조금", "많이", "그냥", "제일", "가장",
+    "나는", "내가", "저는", "제가", "우리", "저희", "그것", "이것", "무엇", "뭔가", "같이", "있다", "없다", "있어", "없어", "있었", "없었",
+    "감사", "고마", "고맙", "고마웠", "하다", "했", "해주", "해주셨", "해줬", "되다", "싶다", "싶어", "때문", "없음", "기록",
+}
+
+
+def tokenize_ko(text):
+    terms = []
+    for tok in TERM_RE.findall(text or ""):
+        tok = tok.lower()
+        if "가" <= tok[0] <= "힣":
+            if tok in KO_SUFFIXES or tok in KO_PARTICLES_1: continue  # 어미/조사만으로 된 토큰 (했어요, 해서 등)
+            if len(tok) == 2 and tok.endswith("요"): continue  # 자요, 가요, 봐요: 한 글자 동사 + 요
+            for suf in KO_SUFFIXES:
+                if tok.endswith(suf):
+                    stem = tok[:-len(suf)]
+                    if len(stem) >= 2 or stem in KO_SHORT_NOUNS: tok = stem
+                    elif suf in KO_ENDINGS: tok = ""  # 한 글자 어간 + 어미는 동사/형용사 (자요, 많아요)
+                    break
+            else:
+                # 한 글자 조사는 세 글자 이상이거나, 떼고 남는 것이 흔한 한 글자 명사일 때만 뗀다
+                if tok.endswith(KO_PARTICLES_1) and (len(tok) >= 3 or tok[:-1] in KO_SHORT_NOUNS): tok = tok[:-1]
+        if (len(tok) >= 2 or tok in KO_SHORT_NOUNS) and tok not in KO_STOPWORDS: terms.append(tok)
+    return terms
+
+
+def term_counts(records):
+    counts = Counter()
+    for rec in records:
+        counts.update(tokenize_ko(rec.get("감사한 일")))
+        counts.update(tokenize_ko(rec.get("하고 싶은 말")))
+    return counts
+
+
+def parse_emotion_group(emotion):
+    if isinstance(emotion, str) and " - " in emotion:
+        main_g = emotion.split(" - ")[0].strip()
+        if main_g in EMOTION_GROUPS: return main_g
+    return None
+
+
+class StudentRecords:
+    # 학생 한 명의 기록을 열 단위(헤더 -> 값 목록)로 보관하는 읽기용 사본. 행마다 dict를 두지 않고, 날짜/감정 문자열은 intern해
+    # 학생들끼리 공유하므로 작다. 날짜 -> 위치 인덱스를 함께 두고, 같은 날짜에 여러 건이면 가장 나중 행(primary)을 기본으로 쓴다.
+    INTERNED = ("날짜", "감정")
+
+    def __init__(self, records, version):
+        self.version = version
+        self.rows = array("l", [rec["_row"] for rec in records])
+        self.columns = {h: [sys.intern(v) if h in self.INTERNED and isinstance(v, str) else v for v in (rec.get(h) for rec in records)]
+                        for h in ENTRY_COLUMNS}
+        self.pos_of_row, self.by_date = {}, {}
+        for pos, (row_num, date) in enumerate(zip(self.rows, self.columns["날짜"])):
+            self.pos_of_row[row_num] = pos
+            self.by_date.setdefault(date, []).append(pos)
+        self.nbytes = self._estimate_nbytes()
+
+    def _estimate_nbytes(self):
+        # intern된 문자열은 한 번만 센다 (다른 학생과 공유되는 부분까지 포함한 대략적인 값)
+        seen, total = set(), sys.getsizeof(self.rows) + sys.getsizeof(self.pos_of_row) + sys.getsizeof(self.by_date)
+        total += sum(sys.getsizeof(v) for v in self.by_date.values())
+        for col in self.columns.values():
+            total += sys.getsizeof(col)
+            for v in col:
+                if id(v) not in seen: seen.add(id(v)); total += sys.getsizeof(v)
+        return total
+
+    def __len__(self):
+        return len(self.rows)
+
+    def record(self, pos):
+        # 화면/GPT에서 쓰는 dict 형태 (시트 헤더 키 + "_row"). 호출할 때마다 새로 만든다.
+        rec = {h: col[pos] for h, col in self.columns.items()}
+        rec["_row"] = self.rows[pos]
+        return rec
+
+    def records(self):
+        return [self.record(pos) for pos in range(len(self.rows))]
+
+    def entries(self, date_str):
+        return [self.record(pos) for pos in self.by_date.get(date_str, [])]
+
+    def primary(self, date_str):
+        positions = self.by_date.get(date_str)
+        return self.record(positions[-1]) if positions else None
+
+    def at_row(self, row_num):
+        pos = self.pos_of_row.get(row_num)
+        return None if pos is None else self.record(pos)
+
+    def set_note(self, row_num, note):
+        if row_num in self.pos_of_row: self.columns["선생님 쪽지"][self.pos_of_row[row_num]] = note
+
+
+class RecordCache:
+    # 프로세스 전체(모든 세션)가 공유하는 학생별 StudentRecords 캐시. 저장소의 학생 version이 같을 때만 재사용하고,
+    # 합계가 budget_bytes를 넘으면 가장 오래 쓰지 않은 학생부터 버린다 (LRU).
+    def __init__(self, budget_bytes):
+        self.budget_bytes, self.nbytes = budget_bytes, 0
+        self.entries, self.lock = OrderedDict(), threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, name, version, load):
+        # load()는 record dict 목록을 돌려주는 함수 (캐시 미스일 때만 lock 밖에서 호출)
+        with self.lock:
+            cached = self.entries.get(name)
+            if cached is not None and cached.version == version:
+                self.entries.move_to_end(name); self.hits += 1
+                return cached
+            self.misses += 1
+        recs = StudentRecords(load(), version)
+        with self.lock:
+            self._drop(name)
+            self.entries[name] = recs; self.nbytes += recs.nbytes
+            while self.nbytes > self.budget_bytes and len(self.entries) > 1:
+                self._drop(next(iter(self.entries))); self.evictions += 1
+        return recs
+
+    def _drop(self, name):
+        old = self.entries.pop(name, None)
+        if old is not None: self.nbytes -= old.nbytes
+
+    def note_written(self, name, row_num, note, new_version):
+        # 쪽지 저장은 캐시를 버리지 않고 그 칸만 고친다. 그 사이 동기화 등으로 version이 어긋났으면 이 학생만 버린다.
+        with self.lock:
+            cached = self.entries.get(name)
+            if cached is None: return
+            if cached.version == new_version - 1: cached.set_note(row_num, note); cached.version = new_version
+            else: self._drop(name)
+
+    def stats(self):
+        with self.lock:
+            return {"students": len(self.entries), "nbytes": self.nbytes, "budget_bytes": self.budget_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class DiaryStore:
+    # 학생목록과 모든 학생 일기 행을 담는 로컬 SQLite 사본. Sheets는 동기화와 쪽지 쓰기에만 사용한다.
+    # 연결 하나를 여러 스레드(동기화 작업, 스크립트 실행)가 공유하므로 모든 접근은 lock 안에서 한다.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            for table, col, col_type in MIGRATIONS:
+                if col not in [r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")]:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+            # 쓰는 도중 프로세스가 끝났던 쪽지는 다시 대기 상태로
+            self.conn.execute("UPDATE note_queue SET status='pending' WHERE status='flushing'")
+        self.version = 0  # 쓰기마다 증가. 파생 데이터 캐시 키로 사용
+
+    def _bump(self):
+        self.version += 1
+
+    # --- 학생목록 ---
+    def replace_roster(self, roster, problems=()):
+        # roster: [(이름, 시트URL, 워크시트 또는 None), ...]. 위치(URL, 워크시트)가 바뀐 학생은 커서를 초기화해 전체 재동기화되게 한다.
+        # 학생은 이름으로 구분하므로 같은 이름이 또 나오면 첫 번째만 쓴다. problems: 학생목록 행별 오류 메시지 (화면 표시용)
+        with self.lock, self.conn:
+            old = {r["name"]: (r["sheet_url"], r["worksheet"]) for r in self.conn.execute("SELECT name, sheet_url, worksheet FROM students")}
+            names = set()
+            for pos, (name, url, worksheet) in enumerate(roster):
+                if name in names: continue
+                names.add(name)
+                if name not in old:
+                    self.conn.execute("INSERT INTO students (name, sheet_url, worksheet, position) VALUES (?, ?, ?, ?)", (name, url, worksheet, pos))
+                elif old[name] != (url, worksheet):
+                    self.conn.execute("UPDATE students SET sheet_url=?, worksheet=?, position=?, header=NULL, n_rows=0, last_row=NULL, "
+                                      "synced_at=NULL, full_synced_at=NULL, sync_error=NULL, version=version+1, term_rules=NULL "
+                                      "WHERE name=?", (url, worksheet, pos, name))
+                    self.conn.execute("DELETE FROM entries WHERE student=?", (name,))
+                    self.conn.execute("DELETE FROM term_freq WHERE student=?", (name,))
+                    # 시트에 못 쓴 쪽지는 예전 시트의 행 번호를 가리키므로 버린다 (새 시트에 잘못 쓰거나 재동기화한 칸을 덮지 않게)
+                    self.conn.execute("DELETE FROM note_queue WHERE student=?", (name,))
+                else:
+                    self.conn.execute("UPDATE students SET position=? WHERE name=?", (pos, name))
+            for name in set(old) - names:
+                for table, col in (("students", "name"), ("entries", "student"), ("term_freq", "student"), ("note_queue", "student"),
+                                   ("gpt_reports", "student"), ("gpt_digests", "student")):
+                    self.conn.execute(f"DELETE FROM {table} WHERE {col}=?", (name,))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('roster_synced_at', ?)", (str(time.time()),))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('roster_problems', ?)", (json.dumps(list(problems), ensure_ascii=False),))
+            self._bump()
+
+    def has_roster(self):
+        with self.lock: return self.conn.execute("SELECT 1 FROM meta WHERE key='roster_synced_at'").fetchone() is not None
+
+    def roster_problems(self):
+        with self.lock: r = self.conn.execute("SELECT value FROM meta WHERE key='roster_problems'").fetchone()
+        return json.loads(r["value"]) if r else []
+
+    def students_df(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT name, sheet_url, worksheet FROM students ORDER BY position").fetchall()
+        # object 열로 둔다: 문자열 열로 추론되면 워크시트 없음(None)이 NaN이 되어 참으로 평가된다
+        return (pd.DataFrame([(r["name"], r["sheet_url"], r["worksheet"]) for r in rows], columns=["이름", "시트URL", "워크시트"], dtype=object)
+                if rows else pd.DataFrame())
+
+    # --- 동기화 커서 ---
+    def get_cursor(self, name):
+        with self.lock:
+            r = self.conn.execute("SELECT header, n_rows, last_row, synced_at, full_synced_at FROM students WHERE name=?", (name,)).fetchone()
+        if r is None: return None
+        return {"header": json.loads(r["header"]) if r["header"] else None, "n_rows": r["n_rows"] or 0,
+                "last_row": json.loads(r["last_row"]) if r["last_row"] else None,
+                "synced_at": r["synced_at"], "full_synced_at": r["full_synced_at"] or 0.0}
+
+    def _entry_rows(self, name, first_row_num, records):
+        out = []
+        for i, rec in enumerate(records):
+            out.append((name, first_row_num + i, rec.get("날짜"), rec.get("감정"), parse_emotion_group(rec.get("감정")),
+                        rec.get("감사한 일"), rec.get("하고 싶은 말"), rec.get("선생님 쪽지")))
+        return out
+
+    def _add_terms(self, name, records):
+        # 이미 센 빈도에 더한다. 전부 다시 셀 때는 _recount_terms
+        self.conn.executemany("INSERT INTO term_freq VALUES (?, ?, ?) ON CONFLICT(student, term) DO UPDATE SET count=count+excluded.count",
+                              [(name, term, n) for term, n in term_counts(records).items()])
+
+    def _recount_terms(self, name, records):
+        self.conn.execute("DELETE FROM term_freq WHERE student=?", (name,))
+        self._add_terms(name, records)
+        self.conn.execute("UPDATE students SET term_rules=? WHERE name=?", (TERM_RULES_VERSION, name))
+
+    def _terms_complete(self, name):
+        r = self.conn.execute("SELECT term_rules FROM students WHERE name=?", (name,)).fetchone()
+        return r is not None and r["term_rules"] == TERM_RULES_VERSION
+
+    def replace_entries(self, name, first_row_num, records, header, n_rows, last_row):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE student=?", (name,))
+            self.conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._entry_rows(name, first_row_num, records))
+            self._recount_terms(name, records)
+            # 아직 시트에 쓰지 못한 쪽지는 재동기화로 덮어쓰지 않는다
+            self.conn.execute("UPDATE entries SET note=(SELECT q.note FROM note_queue q WHERE q.student=entries.student AND q.row_num=entries.row_num) "
+                              "WHERE student=? AND row_num IN (SELECT row_num FROM note_queue WHERE student=? AND status!='flushed')", (name, name))
+            self.conn.execute("UPDATE students SET header=?, n_rows=?, last_row=?, synced_at=?, full_synced_at=?, sync_error=NULL, "
+                              "version=version+1 WHERE name=?", (json.dumps(header), n_rows, json.dumps(last_row), now, now, name))
+            self._bump()
+
+    def append_entries(self, name, first_row_num, records, n_rows, last_row):
+        with self.lock, self.conn:
+            if records:
+                self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                      self._entry_rows(name, first_row_num, records))
+                # 빈도가 현재 규칙으로 다 세어져 있을 때만 더한다. 아니면 term_frequencies가 처음 볼 때 전부 다시 센다
+                if self._terms_complete(name): self._add_terms(name, records)
+                self.conn.execute("UPDATE students SET n_rows=?, last_row=?, version=version+1 WHERE name=?",
+                                  (n_rows, json.dumps(last_row), name))
+                self._bump()
+            self.conn.execute("UPDATE students SET synced_at=? WHERE name=?", (time.time(), name))
+            if self.conn.execute("UPDATE students SET sync_error=NULL WHERE name=? AND sync_error IS NOT NULL", (name,)).rowcount:
+                self._bump()
+
+    def set_sync_error(self, name, error):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE students SET sync_error=? WHERE name=?", (error, name))
+            self._bump()
+
+    def mark_class_synced(self):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('class_synced_at', ?)", (str(time.time()),))
+
+    def class_synced_at(self):
+        with self.lock:
+            r = self.conn.execute("SELECT value FROM meta WHERE key='class_synced_at'").fetchone()
+        return float(r["value"]) if r else None
+
+    # --- 조회 ---
+    def today_summary(self, today_str):
+        # fetch_all_students_today_data와 같은 entry dict 목록 (학생목록 순서)
+        with self.lock:
+            students = self.conn.execute("SELECT name, sheet_url, sync_error FROM students ORDER BY position").fetchall()
+            todays = {}
+            # (student, date) 인덱스 조회. 같은 날 여러 건이면 StudentRecords.primary와 같이 가장 나중 행을 쓴다.
+            for r in self.conn.execute("SELECT student, emotion, message FROM entries WHERE date=? ORDER BY row_num", (today_str,)):
+                todays[r["student"]] = r
+        summary = []
+        for s in students:
+            entry = {"name": s["name"], "emotion_today": None, "message_today": None, "error": None}
+            url = s["sheet_url"]
+            if not url or not isinstance(url, str) or not url.startswith("http"): entry["error"] = "시트 URL 형식 오류"
+            elif s["name"] in todays: entry["emotion_today"], entry["message_today"] = todays[s["name"]]["emotion"], todays[s["name"]]["message"]
+            else: entry["error"] = s["sync_error"] or "오늘 일기 없음"
+            summary.append(entry)
+        return summary
+
+    def student_records(self, name):
+        # 시트와 같은 헤더 키의 dict 목록 + 시트 행 번호("_row")
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM entries WHERE student=? ORDER BY row_num", (name,)).fetchall()
+        records = []
+        for r in rows:
+            rec = {h: r[col] for h, col in ENTRY_COLUMNS.items()}
+            rec["_row"] = r["row_num"]
+            records.append(rec)
+        return records
+
+    def emotion_rows(self):
+        # 학급 추이용 (student, row_num, date, emotion_group) 전체. emotion_group은 저장할 때 이미 파싱되어 있다.
+        with self.lock:
+            return pd.read_sql_query("SELECT student, row_num, date, emotion_group FROM entries ORDER BY student, row_num", self.conn)
+
+    def content_stamp(self):
+        # 학생별 version을 합친 값. 메모리의 self.version과 달리 재시작해도 같은 데이터면 같으므로 파일로 저장한 파생 데이터 확인용
+        with self.lock:
+            rows = self.conn.execute("SELECT name, version FROM students ORDER BY name").fetchall()
+        return hashlib.sha256("\n".join(f"{r['name']}\t{r['version']}" for r in rows).encode("utf-8")).hexdigest()[:16]
+
+    def term_frequencies(self, name, limit=200):
+        with self.lock, self.conn:
+            if not self._terms_complete(name):
+                # 단어 빈도 기능이 생기기 전(또는 추출 규칙이 바뀌기 전)에 저장된 학생은 한 번 전부 다시 센다
+                self._recount_terms(name, self.student_records(name))
+            rows = self.conn.execute("SELECT term, count FROM term_freq WHERE student=? ORDER BY count DESC LIMIT ?", (name, limit)).fetchall()
+        return {r["term"]: r["count"] for r in rows}
+
+    def student_version(self, name):
+        with self.lock:
+            r = self.conn.execute("SELECT version FROM students WHERE name=?", (name,)).fetchone()
+        return r["version"] if r else None
+
+    def student_sync_info(self, name):
+        with self.lock:
+            r = self.conn.execute("SELECT synced_at, sync_error FROM students WHERE name=?", (name,)).fetchone()
+        return dict(r) if r else None
+
+    def note_column(self, name):
+        # 마지막으로 읽은 2행 헤더에서 '선생님 쪽지' 열 번호 (1부터). 없으면 기본 위치(5열).
+        cur = self.get_cursor(name)
+        header = (cur or {}).get("header") or []
+        return header.index("선생님 쪽지") + 1 if "선생님 쪽지" in header else list(ENTRY_COLUMNS).index("선생님 쪽지") + 1
+
+    # --- 쓰기 (선생님 쪽지) ---
+    def enqueue_note(self, name, row_num, sheet_url, note):
+        # 로컬 사본에는 바로 반영하고 시트 쓰기는 대기열에 넣는다. 갱신된 학생 version을 반환.
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET note=? WHERE student=? AND row_num=?", (note, name, row_num))
+            self.conn.execute("INSERT OR REPLACE INTO note_queue (student, row_num, sheet_url, worksheet, note, status, attempts, queued_at, next_try_at) "
+                              "SELECT ?, ?, ?, worksheet, ?, 'pending', 0, ?, 0 FROM students WHERE name=?",
+                              (name, row_num, sheet_url, note, time.time(), name))
+            self.conn.execute("UPDATE students SET version=version+1 WHERE name=?", (name,))
+            self._bump()
+            return self.conn.execute("SELECT version FROM students WHERE name=?", (name,)).fetchone()["version"]
+
+    def claim_due_notes(self, min_age_sec, max_attempts, force=False):
+        # 쓸 차례가 된 쪽지를 flushing으로 표시하고 반환. pending은 min_age_sec 동안 모아서(디바운스) 쓰고,
+        # failed는 next_try_at이 지났고 시도 횟수가 남았을 때만 다시 쓴다.
+        now = time.time()
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT * FROM note_queue WHERE (status='pending' AND (? OR queued_at<=?)) "
+                "OR (status='failed' AND attempts<? AND (? OR next_try_at<=?))",
+                (force, now - min_age_sec, max_attempts, force, now)).fetchall()
+            self.conn.executemany("UPDATE note_queue SET status='flushing' WHERE student=? AND row_num=?",
+                                  [(r["student"], r["row_num"]) for r in rows])
+        return [dict(r) for r in rows]
+
+    def mark_notes_flushed(self, items):
+        now = time.time()
+        with self.lock, self.conn:
+            for it in items:
+                # 쓰는 동안 다시 수정된 쪽지(pending으로 바뀜)는 건드리지 않는다
+                if not self.conn.execute("UPDATE note_queue SET status='flushed', error=NULL, flushed_at=? "
+                                         "WHERE student=? AND row_num=? AND status='flushing' AND note=?",
+                                         (now, it["student"], it["row_num"], it["note"])).rowcount: continue
+                r = self.conn.execute("SELECT n_rows, last_row FROM students WHERE name=?", (it["student"],)).fetchone()
+                # 커서 위치 행에 쓴 경우 변경 감지용 값도 맞춰 둬야 다음 증분 동기화가 전체 재동기화로 빠지지 않는다
+                if r and r["n_rows"] == it["row_num"] and r["last_row"]:
+                    last_row, col = json.loads(r["last_row"]), self.note_column(it["student"]) - 1
+                    last_row += [""] * (col + 1 - len(last_row)); last_row[col] = it["note"]
+                    while last_row and last_row[-1] in ("", None): last_row.pop()
+                    self.conn.execute("UPDATE students SET last_row=? WHERE name=?", (json.dumps(last_row), it["student"]))
+            self.conn.execute("DELETE FROM note_queue WHERE status='flushed' AND flushed_at<?", (now - 86400,))
+
+    def mark_notes_failed(self, items, error, retry_delay_sec):
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE note_queue SET status='failed', attempts=attempts+1, error=?, next_try_at=? "
+                                  "WHERE student=? AND row_num=? AND status='flushing'",
+                                  [(error, time.time() + retry_delay_sec, it["student"], it["row_num"]) for it in items])
+
+    def retry_failed_notes(self):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE note_queue SET status='pending', attempts=0, queued_at=0 WHERE status='failed'")
+
+    def note_status(self, name, row_num):
+        with self.lock:
+            r = self.conn.execute("SELECT status, attempts, error FROM note_queue WHERE student=? AND row_num=?", (name, row_num)).fetchone()
+        return dict(r) if r else None
+
+    def note_queue_counts(self):
+        with self.lock:
+            return {r["status"]: r["n"] for r in self.conn.execute("SELECT status, COUNT(*) AS n FROM note_queue GROUP BY status")}
+
+    # --- GPT 리포트/요약 ---
+    def get_gpt_report(self, key):
+        with self.lock:
+            r = self.conn.execute("SELECT * FROM gpt_reports WHERE key=?", (key,)).fetchone()
+        return dict(r) if r else None
+
+    def put_gpt_report(self, key, name, model, prompt_version, mode, report, through_row=None):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO gpt_reports (key, student, model, prompt_version, mode, report, created_at, through_row) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (key, name, model, prompt_version, mode, report, time.time(), through_row))
+
+    def latest_gpt_report(self, name):
+        with self.lock:
+            r = self.conn.execute("SELECT * FROM gpt_reports WHERE student=? ORDER BY created_at DESC LIMIT 1", (name,)).fetchone()
+        return dict(r) if r else None
+
+    def get_gpt_digest(self, name):
+        with self.lock:
+            r = self.conn.execute("SELECT * FROM gpt_digests WHERE student=?", (name,)).fetchone()
+        return dict(r) if r else None
+
+    def put_gpt_digest(self, name, through_row, through_date, source_hash, digest, model, prompt_version):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO gpt_digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (name, through_row, through_date, source_hash, digest, model, prompt_version, time.time()))
+
+    # --- 학급 전체 GPT 분석 작업 ---
+    def create_gpt_job(self, students, incremental):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE gpt_jobs SET status='stopped' WHERE status='running'")
+            job_id = self.conn.execute("INSERT INTO gpt_jobs (incremental, status, created_at) VALUES (?, 'running', ?)",
+                                       (int(incremental), time.time())).lastrowid
+            self.conn.executemany("INSERT INTO gpt_job_items (job_id, student, status) VALUES (?, ?, 'pending')",
+                                  [(job_id, name) for name in students])
+        return job_id
+
+    def latest_gpt_job(self):
+        with self.lock:
+            job = self.conn.execute("SELECT * FROM gpt_jobs ORDER BY job_id DESC LIMIT 1").fetchone()
+            if not job: return None
+            counts = {r["status"]: r["n"] for r in self.conn.execute(
+                "SELECT status, COUNT(*) AS n FROM gpt_job_items WHERE job_id=? GROUP BY status", (job["job_id"],))}
+        return dict(job, counts=counts, total=sum(counts.values()))
+
+    def gpt_job_todo(self, job_id):
+        # 아직 끝나지 않은 학생 (실패한 학생도 다시 시도)
+        with self.lock:
+            return [r["student"] for r in self.conn.execute(
+                "SELECT student FROM gpt_job_items WHERE job_id=? AND status!='done' ORDER BY rowid", (job_id,))]
+
+    def set_gpt_job_item(self, job_id, name, status, report_key=None, error=None):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE gpt_job_items SET status=?, report_key=?, error=?, finished_at=? WHERE job_id=? AND student=?",
+                              (status, report_key, error, time.time(), job_id, name))
+
+    def set_gpt_job_status(self, job_id, status):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE gpt_jobs SET status=?, finished_at=? WHERE job_id=?",
+                              (status, time.time() if status != "running" else None, job_id))
@@ -0,0 +1,306 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import gspread
+from gspread.utils import a1_to_rowcol
+
+# teacher_diary_app.py가 쓰는 gspread / OpenAI 클라이언트 표면만 흉내 낸 오프라인 대역.
+# 호출 지연, 분당 할당량(429), 무작위 5xx, 데이터 규모(학생 수 x 일수)를 조정할 수 있다. bench_dashboard.py에서 사용.
+
+HEADER = ["날짜", "감정", "감사한 일", "하고 싶은 말", "선생님 쪽지"]
+EMOTIONS = {
+    "😀 긍정": ["기쁨", "설렘", "뿌듯함", "신남"],
+    "😐 보통": ["평온", "무난함", "피곤함"],
+    "😢 부정": ["슬픔", "화남", "속상함", "걱정"],
+}
+GRATITUDE = ["친구가 같이 놀아줘서 고마웠어요", "엄마가 맛있는 저녁을 해주셨어요", "체육 시간에 축구를 해서 재미있었어요",
+             "짝꿍이 지우개를 빌려줬어요", "할머니랑 통화했어요", "도서관에서 재미있는 책을 읽었어요", ""]
+MESSAGES = ["선생님 오늘 수업 재미있었어요", "친구랑 싸워서 속상해요", "숙제가 너무 많아요", "내일 현장체험학습 기대돼요",
+            "요즘 잠을 잘 못 자요", "", "", ""]
+ROW_RE = re.compile(r"^([A-Z]+)?(\d+)?(?::([A-Z]+)?(\d+)?)?$")
+
+
+def _split_range(rng):
+    # "'시트 이름'!A1:E" -> ("시트 이름", "A1:E"), "'시트 이름'" -> ("시트 이름", "") (시트 전체). 시트 이름이 없으면 (None, rng)
+    if "!" not in rng: return ((rng[1:-1].replace("''", "'"), "") if rng.startswith("'") and rng.endswith("'") else (None, rng))
+    title, a1 = rng.rsplit("!", 1)
+    if title.startswith("'") and title.endswith("'"): title = title[1:-1].replace("''", "'")
+    return title, a1
+
+
+class FakeResponse:
+    # gspread.exceptions.APIError가 읽는 requests.Response의 일부
+    def __init__(self, status_code, message):
+        self.status_code, self.text = status_code, message
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": "FAKE"}}
+
+
+class FakeBackendConfig:
+    def __init__(self, latency_sec=0.0, latency_jitter_sec=0.0, quota_per_min=None, error_rate=0.0, seed=0):
+        self.latency_sec, self.latency_jitter_sec = latency_sec, latency_jitter_sec
+        self.quota_per_min, self.error_rate = quota_per_min, error_rate
+        self.rng = random.Random(seed)
+
+
+class _CallGate:
+    # 모든 가짜 API 호출이 거치는 곳: 호출 기록, 지연, 할당량 초과/무작위 오류 발생
+    def __init__(self, config):
+        self.config, self.lock = config, threading.Lock()
+        self.calls, self.recent = [], deque()
+
+    def __call__(self, op):
+        cfg = self.config
+        with self.lock:
+            now = time.monotonic()
+            self.calls.append(op)
+            while self.recent and now - self.recent[0] > 60: self.recent.popleft()
+            over_quota = cfg.quota_per_min is not None and len(self.recent) >= cfg.quota_per_min
+            if not over_quota: self.recent.append(now)
+            fail = cfg.error_rate and cfg.rng.random() < cfg.error_rate
+            delay = cfg.latency_sec + (cfg.rng.uniform(0, cfg.latency_jitter_sec) if cfg.latency_jitter_sec else 0)
+        if delay: time.sleep(delay)
+        if over_quota: raise gspread.exceptions.APIError(FakeResponse(429, "Quota exceeded for quota metric 'Read requests'"))
+        if fail: raise gspread.exceptions.APIError(FakeResponse(503, "The service is currently unavailable."))
+
+    def count(self, prefix=""):
+        with self.lock: return sum(1 for op in self.calls if op.startswith(prefix))
+
+    def reset(self):
+        with self.lock: self.calls.clear()
+
+
+class FakeWorksheet:
+    def __init__(self, gate, title, rows, col_count=26):
+        self.gate, self.title, self.rows, self.col_count = gate, title, rows, col_count
+        self.lock = threading.Lock()
+
+    def _range(self, a1):
+        m = ROW_RE.match(a1.split("!")[-1])
+        start_row = int(m.group(2)) if m.group(2) else 1
+        end_row = int(m.group(4)) if m.group(4) else (start_row if m.group(3) is None and m.group(2) else len(self.rows))
+        first_col = a1_to_rowcol(f"{m.group(1) or 'A'}1")[1]
+        last_col = a1_to_rowcol(f"{m.group(3) or m.group(1) or 'Z'}1")[1]
+        out = [list(r[first_col - 1:last_col]) for r in self.rows[start_row - 1:end_row]]
+        for r in out:
+            while r and r[-1] == "": r.pop()
+        while out and not out[-1]: out.pop()
+        return out
+
+    def get_all_values(self):
+        self.gate("values.get")
+        with self.lock:
+            width = max((len(r) for r in self.rows), default=0)
+            return [list(r) + [""] * (width - len(r)) for r in self.rows]
+
+    def get_all_records(self, head=1):
+        self.gate("values.get")
+        with self.lock:
+            keys = self.rows[head - 1]
+            return [dict(zip(keys, r)) for r in self.rows[head:]]
+
+    def batch_get(self, ranges):
+        self.gate("values.batchGet")
+        with self.lock: return [self._range(a1) for a1 in ranges]
+
+    def row_values(self, row):
+        self.gate("values.get")
+        with self.lock: return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row: self.rows.append([])
+        r = self.rows[row - 1]
+        r.extend([""] * (col - len(r)))
+        r[col - 1] = value
+
+    def update_cell(self, row, col, value):
+        self.gate("values.update")
+        with self.lock: self._set(row, col, value)
+
+    def batch_update(self, data, **kwargs):
+        self.gate("values.batchUpdate")
+        with self.lock:
+            for item in data:
+                row0, col0 = a1_to_rowcol(_split_range(item["range"])[1].split(":")[0])
+                for i, r in enumerate(item["values"]):
+                    for j, v in enumerate(r): self._set(row0 + i, col0 + j, v)
+        return {"totalUpdatedCells": len(data)}
+
+    def update(self, values, range_name=None, **kwargs):
+        self.gate("values.update")
+        row0, col0 = a1_to_rowcol(_split_range(range_name or "A1")[1].split(":")[0])
+        with self.lock:
+            for i, r in enumerate(values):
+                for j, v in enumerate(r): self._set(row0 + i, col0 + j, v)
+        return {"updatedRows": len(values)}
+
+    def clear(self):
+        self.gate("values.clear")
+        with self.lock: self.rows.clear()
+
+    def add_cols(self, n):
+        self.gate("spreadsheets.batchUpdate")
+        self.col_count += n
+
+    def append_row(self, values):
+        # 벤치마크에서 학생이 새 일기를 쓴 상황을 만들 때 사용 (API 호출로 세지 않음)
+        with self.lock: self.rows.append(list(values))
+
+
+class FakeSpreadsheet:
+    def __init__(self, gate, url, title, worksheets):
+        self.gate, self.url, self.title, self._worksheets = gate, url, title, worksheets
+        self.id = url.rstrip("/").split("/")[-1]
+
+    def _by_title(self, title):
+        for ws in self._worksheets:
+            if ws.title == title: return ws
+        return None
+
+    def worksheet(self, title):
+        self.gate("spreadsheets.get")
+        ws = self._by_title(title)
+        if ws is None: raise gspread.exceptions.WorksheetNotFound(title)
+        return ws
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self.gate("spreadsheets.batchUpdate")
+        if self._by_title(title): raise gspread.exceptions.APIError(FakeResponse(400, f"A sheet with the name \"{title}\" already exists."))
+        ws = FakeWorksheet(self.gate, title, [], col_count=cols)
+        self._worksheets.append(ws)
+        return ws
+
+    def values_batch_get(self, ranges, params=None):
+        # 요청 하나로 여러 워크시트의 범위를 읽는다. 없는 시트 이름이 하나라도 있으면 요청 전체가 400.
+        self.gate("values.batchGet")
+        out = []
+        for rng in ranges:
+            title, a1 = _split_range(rng)
+            ws = self._by_title(title) if title else self._worksheets[0]
+            if ws is None: raise gspread.exceptions.APIError(FakeResponse(400, f"Unable to parse range: {rng}"))
+            with ws.lock: values = ws._range(a1)
+            out.append({"range": rng, "majorDimension": "ROWS", **({"values": values} if values else {})})
+        return {"spreadsheetId": self.id, "valueRanges": out}
+
+    def values_batch_update(self, body=None):
+        self.gate("values.batchUpdate")
+        for item in body["data"]:
+            title, a1 = _split_range(item["range"])
+            ws = self._by_title(title) if title else self._worksheets[0]
+            if ws is None: raise gspread.exceptions.APIError(FakeResponse(400, f"Unable to parse range: {item['range']}"))
+            row0, col0 = a1_to_rowcol(a1.split(":")[0])
+            with ws.lock:
+                for i, r in enumerate(item["values"]):
+                    for j, v in enumerate(r): ws._set(row0 + i, col0 + j, v)
+        return {"totalUpdatedCells": len(body["data"])}
+
+    @property
+    def sheet1(self):
+        self.gate("spreadsheets.get")
+        return self._worksheets[0]
+
+    def worksheets(self):
+        self.gate("spreadsheets.get")
+        return list(self._worksheets)
+
+
+class FakeGspreadClient:
+    # open / open_by_url만 지원. 학생 시트는 1행 제목, 2행 헤더, 3행부터 일기.
+    # workbooks=0이면 학생마다 전용 스프레드시트, N이면 학생들을 N개의 통합 문서에 워크시트로 나눠 담고 학생목록에 '워크시트' 열을 둔다.
+    def __init__(self, n_students=40, n_days=365, submit_rate=0.85, config=None, end_date=None, seed=0, workbooks=0):
+        self.config = config or FakeBackendConfig(seed=seed)
+        self.gate = _CallGate(self.config)
+        rng, end_date = random.Random(seed), end_date or date.today()
+        self.by_url, roster = {}, [["이름", "시트URL", "워크시트"] if workbooks else ["이름", "시트URL"]]
+        books = [self.add_workbook() for _ in range(workbooks)]
+        for i in range(n_students):
+            name = f"학생{i + 1:02d}"
+            rows = [[f"{name} 감정일기"], list(HEADER)]
+            for d in range(n_days):
+                if rng.random() > submit_rate: continue
+                group = rng.choices(list(EMOTIONS), weights=[5, 3, 2])[0]
+                rows.append([(end_date - timedelta(days=n_days - 1 - d)).strftime("%Y-%m-%d"), f"{group} - {rng.choice(EMOTIONS[group])}",
+                             rng.choice(GRATITUDE), rng.choice(MESSAGES), ""])
+            if workbooks:
+                url = books[i * workbooks // n_students]
+                self.by_url[url]._worksheets.append(FakeWorksheet(self.gate, name, rows))
+                roster.append([name, url, name])
+            else:
+                url = f"https://docs.google.com/spreadsheets/d/fake-student-{i + 1:02d}"
+                self.by_url[url] = FakeSpreadsheet(self.gate, url, f"{name} 감정일기", [FakeWorksheet(self.gate, "Sheet1", rows)])
+                roster.append([name, url])
+        self.roster = FakeSpreadsheet(self.gate, "https://docs.google.com/spreadsheets/d/fake-roster", "학생목록",
+                                      [FakeWorksheet(self.gate, "Sheet1", roster)])
+
+    def add_workbook(self):
+        # 빈 통합 문서 (첫 시트 "Sheet1"은 비어 있음). 이전 도구의 대상으로도 쓴다.
+        url = f"https://docs.google.com/spreadsheets/d/fake-workbook-{sum(1 for u in self.by_url if 'workbook' in u) + 1:02d}"
+        self.by_url[url] = FakeSpreadsheet(self.gate, url, "감정일기 통합", [FakeWorksheet(self.gate, "Sheet1", [])])
+        return url
+
+    def open(self, title):
+        self.gate("drive.files.list")
+        if title != "학생목록": raise gspread.exceptions.SpreadsheetNotFound(title)
+        return self.roster
+
+    def open_by_url(self, url):
+        self.gate("spreadsheets.get")
+        if url not in self.by_url: raise gspread.exceptions.SpreadsheetNotFound(url)
+        return self.by_url[url]
+
+    def student_worksheet(self, url):
+        return self.by_url[url]._worksheets[0]
+
+    def worksheet_for(self, name):
+        # 현재 학생목록 기준으로 그 학생의 일기 워크시트 (API 호출로 세지 않음)
+        header, *rows = self.roster._worksheets[0].rows
+        for r in rows:
+            rec = dict(zip(header, r))
+            if rec.get("이름") == name:
+                return self.by_url[rec["시트URL"]]._by_title(rec["워크시트"]) if rec.get("워크시트") else self.student_worksheet(rec["시트URL"])
+        raise KeyError(name)
+
+
+# --- OpenAI ---
+class _Obj:
+    def __init__(self, **kw): self.__dict__.update(kw)
+
+
+def _fake_completion(model, messages, max_tokens):
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    content = f"### 가짜 리포트 ({model})\n입력 {prompt_chars}자를 받았습니다."
+    usage = _Obj(prompt_tokens=prompt_chars, completion_tokens=min(max_tokens or 0, 400), total_tokens=prompt_chars + min(max_tokens or 0, 400))
+    return _Obj(choices=[_Obj(message=_Obj(content=content))], usage=usage, model=model)
+
+
+class FakeOpenAI:
+    # chat.completions.create만 지원. latency_sec 만큼 기다린 뒤 입력 길이를 담은 가짜 리포트를 돌려준다.
+    # 앱이 OpenAI(api_key=...)로 직접 만들므로 지연/호출 기록은 functools.partial로 넘긴다. calls를 넘기면 여러 인스턴스가 공유한다.
+    def __init__(self, api_key=None, latency_sec=0.0, calls=None, **kwargs):
+        self.latency_sec, self.calls = latency_sec, [] if calls is None else calls
+        self.chat = _Obj(completions=_Obj(create=self._create))
+
+    def _create(self, model, messages, max_tokens=None, **kwargs):
+        self.calls.append(model)
+        if self.latency_sec: time.sleep(self.latency_sec)
+        return _fake_completion(model, messages, max_tokens)
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    def __init__(self, api_key=None, latency_sec=0.0, calls=None, **kwargs):
+        super().__init__(api_key, latency_sec, calls)
+        self.chat = _Obj(completions=_Obj(create=self._acreate))
+
+    async def _acreate(self, model, messages, max_tokens=None, **kwargs):
+        import asyncio
+        self.calls.append(model)
+        if self.latency_sec: await asyncio.sleep(self.latency_sec)
+        return _fake_completion(model, messages, max_tokens)
+
+    async def close(self):
+        pass
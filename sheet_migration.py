@@ -0,0 +1,80 @@
+import math
+import re
+
+from gspread.utils import ValueInputOption, rowcol_to_a1
+
+# 학생 전용 스프레드시트를 몇 개의 통합 문서(학생마다 워크시트 1개)로 복사하고 학생목록을 새 위치로 바꾸는 도구.
+# 원래 시트는 지우지 않고 학생목록 '이전시트URL' 열에 남긴다. 교사용 사이드바의 관리자 메뉴에서 실행한다.
+# api는 SheetsApi, handles는 SheetHandles (teacher_diary_app.py).
+
+INVALID_TITLE_RE = re.compile(r"[\[\]*?/\\:]")  # 시트 이름에 쓸 수 없는 문자
+ROSTER_WORKSHEET_COL, ROSTER_OLD_URL_COL = "워크시트", "이전시트URL"
+
+
+def worksheet_title(name, used):
+    base = INVALID_TITLE_RE.sub("_", str(name)).strip()[:90] or "학생"
+    title, n = base, 2
+    while title in used: title, n = f"{base} ({n})", n + 1
+    used.add(title)
+    return title
+
+
+def plan_migration(roster_df, workbook_urls):
+    # 학생 전용 시트를 쓰는 학생만 대상으로, 명단 순서대로 통합 문서에 고르게 나눈다. [(이름, 원래URL, 대상URL, 워크시트 이름), ...]
+    if roster_df.empty or not workbook_urls: return []
+    targets = [(name, url) for name, url, title in zip(roster_df["이름"], roster_df["시트URL"], roster_df["워크시트"])
+               if not (isinstance(title, str) and title) and isinstance(url, str) and url.startswith("http")]
+    per_book = math.ceil(len(targets) / len(workbook_urls)) if targets else 1
+    used = {url: set() for url in workbook_urls}
+    plan = []
+    for i, (name, url) in enumerate(targets):
+        book_url = workbook_urls[i // per_book]
+        plan.append((name, url, book_url, worksheet_title(name, used[book_url])))
+    return plan
+
+
+def copy_student_sheet(api, handles, name, src_url, book_url, title, n_cols):
+    # 원래 시트 값을 그대로(행 번호 유지) 대상 워크시트에 쓴다. 같은 이름의 워크시트가 있으면 비우고 다시 쓴다 (다시 실행해도 안전).
+    # 학생 전용 시트 동기화와 같이 모든 열을 읽고, 날짜/숫자가 글자로 바뀌지 않도록 USER_ENTERED로 쓴다 (학생용 앱이 쓴 방식과 같음).
+    values = api.call("get_all_values", name, handles.worksheet(src_url, None, name).get_all_values)
+    width = max([n_cols] + [len(r) for r in values])
+    if title in handles.worksheet_titles(book_url, name):
+        ws = handles.worksheet(book_url, title, name)
+        api.call("clear", name, ws.clear)
+    else:
+        sh = handles.spreadsheet(book_url, name)
+        ws = api.call("add_worksheet", name, sh.add_worksheet, title, max(len(values) + 200, 1000), width)
+        handles.remember_worksheet(book_url, title, ws)
+    if values: api.call("update", name, ws.update, values, f"A1:{rowcol_to_a1(len(values), width)}",
+                        value_input_option=ValueInputOption.user_entered)
+    return len(values)
+
+
+def update_roster(api, handles, plan):
+    # 학생목록의 시트URL을 통합 문서로, '워크시트' 열에 워크시트 이름을, '이전시트URL' 열에 원래 URL을 한 번의 요청으로 쓴다
+    ws = handles.roster_worksheet()
+    values = api.call("get_all_values", "학생목록", ws.get_all_values)
+    header = list(values[0]) if values else []
+    for col in (ROSTER_WORKSHEET_COL, ROSTER_OLD_URL_COL):
+        if col not in header: header.append(col)
+    if len(header) > ws.col_count: api.call("add_cols", "학생목록", ws.add_cols, len(header) - ws.col_count)
+    col_of = {h: i + 1 for i, h in enumerate(header)}
+    name_i = header.index("이름")
+    row_of = {}
+    for i, r in enumerate(values):
+        if i and len(r) > name_i: row_of.setdefault(str(r[name_i]), i + 1)  # 같은 이름이면 앱과 같이 첫 번째 행
+    data = [{"range": "A1", "values": [header]}]
+    for name, src_url, book_url, title in plan:
+        row = row_of[str(name)]
+        data += [{"range": rowcol_to_a1(row, col_of["시트URL"]), "values": [[book_url]]},
+                 {"range": rowcol_to_a1(row, col_of[ROSTER_WORKSHEET_COL]), "values": [[title]]},
+                 {"range": rowcol_to_a1(row, col_of[ROSTER_OLD_URL_COL]), "values": [[src_url]]}]
+    api.call("batch_update", "학생목록", ws.batch_update, data)
+
+
+def migrate_to_workbooks(api, handles, plan, expected_headers, on_progress=None):
+    # 모든 학생 시트를 복사한 뒤에만 학생목록을 바꾼다. 도중에 실패하면 학생목록은 그대로이므로 다시 실행하면 된다.
+    for done, (name, src_url, book_url, title) in enumerate(plan, start=1):
+        copy_student_sheet(api, handles, name, src_url, book_url, title, len(expected_headers))
+        if on_progress: on_progress(done, len(plan), name)
+    update_roster(api, handles, plan)
@@ -2,17 +2,45 @@ import streamlit as st
 import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from openai import OpenAI
+from datetime import datetime, timedelta
 import time # API 호출 지연용 (선택 사항)
+import asyncio, contextvars, hashlib, io, random, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from api_metrics import ApiMetrics, EVENT_FIELDS, payload_bytes
+from class_trends import class_trends, load_emotion_frame
+from diary_store import DiaryStore, EMOTION_GROUPS, RecordCache, parse_emotion_group
+from sheet_migration import migrate_to_workbooks, plan_migration
 
 # --- 상수 정의 ---
 EXPECTED_STUDENT_SHEET_HEADER = ["날짜", "감정", "감사한 일", "하고 싶은 말", "선생님 쪽지"]
-EMOTION_GROUPS = ["😀 긍정", "😐 보통", "😢 부정"]
 FONT_PATH = "NanumGothic.ttf"
 
+# Google Sheets 읽기 할당량: 사용자(서비스 계정)당 분당 60회가 기본값. secrets로 조정 가능.
+SHEETS_READ_QUOTA_PER_MIN = 60
+FETCH_MAX_WORKERS = 8
+FETCH_MAX_RETRIES = 4
+FETCH_BACKOFF_BASE_SEC, FETCH_BACKOFF_MAX_SEC = 1.0, 32.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 학생 시트: 1행 제목, 2행 헤더, 3행부터 일기. 중간 행 수정은 증분 동기화로 감지되지 않으므로 주기적으로 전체 재동기화.
+SHEET_HEADER_ROW = 2
+SYNC_FULL_RESYNC_SEC = 1800
+# 로컬 SQLite 사본 경로와 백그라운드 동기화 주기
+DIARY_DB_PATH = "diary_mirror.sqlite3"
+SYNC_INTERVAL_SEC = 300
+# 통합 문서(학생목록 '워크시트' 열 사용)는 values_batch_get 한 번에 이만큼의 범위를 묶어 읽는다
+WORKBOOK_BATCH_RANGES = 200
+# 선생님 쪽지 쓰기 대기열: 이 시간 동안 모은 쪽지를 시트별로 한 번에 쓰고, 실패하면 백오프하며 재시도
+NOTE_FLUSH_DELAY_SEC = 5
+NOTE_MAX_ATTEMPTS = 5
+# API 호출 계측: 메모리에 보관하는 최근 호출 수와 사이드바의 느린 시트 표시 수
+API_METRICS_MAX_EVENTS = 5000
+API_METRICS_SLOWEST_SHEETS = 5
+# 학생별 기록 공용 캐시(모든 세션 공유)의 메모리 예산. 넘으면 가장 오래 안 본 학생부터 버린다.
+RECORD_CACHE_BUDGET_MB = 64
+# 학급 감정 추이 탭의 기본 조회 기간과 '부정 연속' 기준
+TREND_DEFAULT_DAYS = 28
+TREND_NEG_RUN_DAYS = 3
+
 GPT_CUMULATIVE_SYSTEM_PROMPT = """
 당신은 초등학교 학생들의 심리 및 상담 분야에서 깊은 전문성을 가진 AI 상담 보조입니다. 
 당신의 분석은 인간 중심 상담 이론, 인지 행동 이론 등 실제 상담 이론에 기반해야 합니다. 
@@ -36,6 +64,24 @@ GPT_CUMULATIVE_SYSTEM_PROMPT = """
 6.  **선생님을 위한 상담적 조언 (누적 기록 기반)**: 누적된 기록에서 파악된 학생의 특성을 바탕으로, 선생님께서 이 학생을 지지하고 돕기 위해 활용할 수 있는 인간 중심적 또는 인지 행동적 접근 방식에 기반한 구체적인 상담 전략이나 소통 방법을 1-2가지 제안해주세요.
 """
 
+# GPT 리포트는 (모델, 프롬프트 버전, 모드, 전달한 기록) 해시로 저장소에 보관. 프롬프트를 고치면 버전을 올릴 것.
+GPT_MODEL, GPT_DIGEST_MODEL = "gpt-4o", "gpt-4o-mini"
+GPT_PROMPT_VERSION = "cumulative-v1"
+GPT_MAX_OUTPUT_TOKENS, GPT_DIGEST_MAX_TOKENS = 3500, 1200
+GPT_CONTEXT_TOKENS = 128000
+GPT_INPUT_TOKEN_BUDGET = 24000  # 요청 1건의 입력 토큰 상한 (secrets로 조정 가능)
+GPT_RECENT_ENTRIES = 30  # 증분 모드에서 원문 그대로 보내는 최근 일기 수
+# 학급 전체 분석: 동시 요청 수와 분당 요청/토큰 한도 (OpenAI 계정 등급에 맞게 secrets로 조정)
+GPT_BATCH_CONCURRENCY = 4
+OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT = 500, 30000
+
+GPT_DIGEST_SYSTEM_PROMPT = """
+당신은 초등학생 익명 일기 기록을 선생님의 상담 분석용으로 압축하는 보조입니다.
+[이전 요약]과 [새 기록]을 합쳐 하나의 누적 요약을 한국어로 작성하세요.
+기간별 감정 흐름(긍정/보통/부정의 비율과 변화 시점), 반복되는 키워드와 대상(친구, 가족, 활동 등), 눈에 띄는 사건이나 표현, 문체 특성을 날짜 범위와 함께 남기고,
+학생의 이름이나 개인 식별 정보는 절대 쓰지 마세요. 800자 이내의 개조식으로 작성하세요.
+"""
+
 # --- 페이지 기본 설정 ---
 st.set_page_config(page_title="감정 일기장 (교사용)", page_icon="🧑‍🏫", layout="wide")
 
@@ -50,23 +96,37 @@ def authorize_gspread():
     except Exception as e:
         st.error(f"Google API 인증 오류: {e}. '.streamlit/secrets.toml' 설정을 확인하세요."); st.stop(); return None
 
+def fetch_roster(api, handles):
+    # ([(이름, 시트URL, 워크시트 또는 None), ...], [행별 오류 메시지]). '워크시트' 열(선택)이 있으면 그 학생은 시트URL 통합 문서 안의 해당 워크시트를 쓴다.
+    # 이름이 빈 행(중간의 빈 줄 포함)은 건너뛰고, 같은 이름이 또 나오면 첫 번째 행만 쓴다.
+    ws = handles.roster_worksheet()
+    df = pd.DataFrame(api.call("get_all_records", "학생목록", ws.get_all_records, head=1))
+    if not df.empty and ("이름" not in df.columns or "시트URL" not in df.columns):
+        raise ValueError("'학생목록' 시트에 '이름' 또는 '시트URL' 열이 없습니다.")
+    if df.empty: return [], []
+    worksheets = df["워크시트"].fillna("").astype(str).str.strip() if "워크시트" in df.columns else pd.Series("", index=df.index)
+    roster, problems, first_row = [], [], {}
+    for i, (name, url, ws_title) in enumerate(zip(df["이름"], df["시트URL"], worksheets)):
+        if not str(name).strip(): continue
+        if name in first_row:
+            problems.append(f"'학생목록' {i + 2}행: 이름 '{name}'이(가) {first_row[name]}행과 중복되어 건너뜁니다."); continue
+        first_row[name] = i + 2
+        roster.append((name, url, ws_title or None))
+    return roster, problems
+
 @st.cache_data(ttl=600)
-def get_students_df(_client_gspread):
+def get_students_df(_client_gspread, data_version=0):
+    get_api_metrics().cache_miss("get_students_df")
     if not _client_gspread: return pd.DataFrame()
+    store = get_diary_store()
     try:
-        ws = _client_gspread.open("학생목록").sheet1
-        df = pd.DataFrame(ws.get_all_records(head=1))
-        if not df.empty and ("이름" not in df.columns or "시트URL" not in df.columns):
-            st.error("'학생목록' 시트에 '이름' 또는 '시트URL' 열이 없습니다."); return pd.DataFrame()
-        return df
+        if not store.has_roster(): store.replace_roster(*fetch_roster(get_sheets_api(), get_sheet_handles(_client_gspread)))
+        return store.students_df()
+    except ValueError as e: st.error(str(e)); return pd.DataFrame()
     except Exception as e: st.error(f"학생 목록 로딩 오류: {e}"); return pd.DataFrame()
 
-def get_records_from_row2_header(worksheet, expected_headers):
-    all_values = worksheet.get_all_values()
-    if len(all_values) < 2: return []
-    data_rows = all_values[2:]
+def rows_to_records(data_rows, expected_headers):
     records = []
-    num_expected_headers = len(expected_headers)
     for r_vals in data_rows:
         rec = {}
         for i, header_name in enumerate(expected_headers):
@@ -74,49 +134,795 @@ def get_records_from_row2_header(worksheet, expected_headers):
         records.append(rec)
     return records
 
-@st.cache_data(ttl=300)
-def fetch_all_students_today_data(_students_df, today_str, _client_gspread, headers_list):
-    all_data = []
-    if _students_df.empty: return all_data
-    loading_msg = st.empty()
-    loading_msg.info("전체 학생의 오늘 자 요약 정보 로딩 중...")
-    for i, (_, row) in enumerate(_students_df.iterrows()):
-        name, url = row["이름"], row["시트URL"]
-        entry = {"name": name, "emotion_today": None, "message_today": None, "error": None}
-        # time.sleep(0.05) # API 할당량 초과 방지를 위한 최소 지연
-        if not url or not isinstance(url, str) or not url.startswith("http"):
-            entry["error"] = "시트 URL 형식 오류"; all_data.append(entry); continue
+class TokenBucket:
+    # 분당 호출 수 제한용 토큰 버킷 (스레드 안전). 버킷 크기만큼은 한 번에 호출 가능.
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate_per_sec = rate_per_min / 60.0
+        self.capacity = capacity or rate_per_min
+        self.tokens, self.updated = float(self.capacity), time.monotonic()
+        self.lock = threading.Lock()
+
+    def _try_take(self, n):
+        # 토큰 n개를 가져가면 0, 부족하면 기다려야 할 초를 반환
+        n = min(n, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_sec)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n; return 0
+            return (n - self.tokens) / self.rate_per_sec
+
+    def acquire(self, n=1):
+        while (wait := self._try_take(n)): time.sleep(wait)
+
+    async def acquire_async(self, n=1, stop_event=None):
+        # stop_event가 설정되면 토큰을 가져가지 않고 False (기다리는 동안에도 0.5초마다 확인)
+        while (wait := self._try_take(n)):
+            if stop_event is not None and stop_event.is_set(): return False
+            await asyncio.sleep(wait if stop_event is None else min(wait, 0.5))
+        return True
+
+class SheetsApi:
+    # Sheets 호출 공통 경로: 할당량 토큰을 받은 뒤 호출하고, 429/5xx는 지수 백오프 + 지터로 재시도.
+    # 호출마다 (op, 대상 시트) 이름으로 지연/크기/상태/재시도 수를 metrics에 남긴다.
+    def __init__(self, quota_per_min, metrics):
+        self.limiter, self.metrics = TokenBucket(quota_per_min), metrics
+
+    def call(self, op, sheet, fn, *args, **kwargs):
+        started, waited, retries, status, result = time.perf_counter(), 0.0, 0, None, None
         try:
-            ws = _client_gspread.open_by_url(url).sheet1
-            recs = get_records_from_row2_header(ws, headers_list)
-            found = False
-            for r in recs:
-                if r.get("날짜") == today_str:
-                    entry["emotion_today"], entry["message_today"] = r.get("감정"), r.get("하고 싶은 말")
-                    found = True; break
-            if not found: entry["error"] = "오늘 일기 없음"
-        except gspread.exceptions.APIError as ge: entry["error"] = f"API 할당량({ge.response.status_code})"
-        except gspread.exceptions.SpreadsheetNotFound: entry["error"] = "시트 찾기 실패"
-        except Exception as e: entry["error"] = f"알 수 없는 오류({type(e).__name__})"
-        all_data.append(entry)
-    loading_msg.empty(); return all_data
+            for attempt in range(FETCH_MAX_RETRIES + 1):
+                t_wait = time.perf_counter(); self.limiter.acquire(); waited += time.perf_counter() - t_wait
+                try:
+                    result = fn(*args, **kwargs); status = 200
+                    return result
+                except gspread.exceptions.APIError as ge:
+                    status = ge.response.status_code
+                    if status not in RETRYABLE_STATUS_CODES or attempt == FETCH_MAX_RETRIES: raise
+                    retries += 1
+                    time.sleep(random.uniform(0, min(FETCH_BACKOFF_MAX_SEC, FETCH_BACKOFF_BASE_SEC * 2 ** attempt)))
+        except gspread.exceptions.SpreadsheetNotFound: status = 404; raise
+        except Exception as e:
+            if status is None: status = type(e).__name__
+            raise
+        finally: self.metrics.record("sheets", op, sheet, started, status, retries, payload_bytes(result) + payload_bytes(args), waited)
+
+@st.cache_resource
+def get_api_metrics():
+    return ApiMetrics(API_METRICS_MAX_EVENTS)
+
+@st.cache_resource
+def get_sheets_api():
+    # 프로세스 전체(모든 세션)가 같은 서비스 계정 할당량을 공유하므로 하나만 생성
+    return SheetsApi(st.secrets.get("SHEETS_READ_QUOTA_PER_MIN", SHEETS_READ_QUOTA_PER_MIN), get_api_metrics())
+
+def _trim_row(r_vals):
+    r_vals = list(r_vals)
+    while r_vals and r_vals[-1] in ("", None): r_vals.pop()
+    return r_vals
+
+class SheetHandles:
+    # Spreadsheet/Worksheet 객체 캐시 (프로세스 공용). 동기화/쪽지 쓰기마다 open_by_url과 시트 메타데이터 요청을 반복하지 않는다.
+    # 그 URL로 호출하다 오류가 나면 forget(url)로 버려 다음번에 다시 연다 (시트 이름 변경, 권한 변경 등).
+    def __init__(self, api, client_gspread):
+        self.api, self.client, self.lock = api, client_gspread, threading.Lock()
+        self.spreadsheets, self.worksheets, self.titles = {}, {}, {}
+
+    def _cached(self, cache, key, load):
+        with self.lock:
+            if key in cache: return cache[key]
+        value = load()
+        with self.lock: cache[key] = value
+        return value
+
+    def roster_worksheet(self):
+        return self._cached(self.worksheets, ("학생목록", ""), lambda: self.api.call("open", "학생목록", lambda: self.client.open("학생목록").sheet1))
+
+    def spreadsheet(self, url, label):
+        return self._cached(self.spreadsheets, url, lambda: self.api.call("open_by_url", label, self.client.open_by_url, url))
+
+    def worksheet(self, url, title, label):
+        # title이 없으면 첫 번째 시트 (학생 전용 스프레드시트)
+        def load():
+            sh = self.spreadsheet(url, label)
+            return self.api.call("worksheet", label, sh.worksheet, title) if title else self.api.call("sheet1", label, lambda: sh.sheet1)
+        return self._cached(self.worksheets, (url, title or ""), load)
+
+    def worksheet_titles(self, url, label):
+        # 통합 문서의 워크시트 이름 집합. 없는 이름을 범위에 넣으면 batchGet 전체가 실패하므로 미리 확인하는 데 쓴다.
+        return self._cached(self.titles, url, lambda: {ws.title for ws in self.api.call("worksheets", label, self.spreadsheet(url, label).worksheets)})
+
+    def remember_worksheet(self, url, title, ws):
+        # 새로 만든 워크시트를 목록을 다시 읽지 않고 캐시에 넣는다
+        with self.lock:
+            self.worksheets[(url, title)] = ws
+            if url in self.titles: self.titles[url] = self.titles[url] | {title}
+
+    def forget(self, url):
+        with self.lock:
+            self.spreadsheets.pop(url, None); self.titles.pop(url, None)
+            for key in [k for k in self.worksheets if k[0] == url]: del self.worksheets[key]
+
+def _last_col(expected_headers):
+    return chr(ord("A") + len(expected_headers) - 1)
+
+def tail_ranges(cur, expected_headers, title=None):
+    # 증분 동기화가 가능하면 [헤더 행, 마지막으로 읽은 행~끝] 범위 (마지막 행은 변경 감지용). 전체 재동기화가 필요하면 None.
+    if cur["n_rows"] < SHEET_HEADER_ROW or time.time() - cur["full_synced_at"] > SYNC_FULL_RESYNC_SEC: return None
+    last_col = _last_col(expected_headers)
+    ranges = [f"A{SHEET_HEADER_ROW}:{last_col}{SHEET_HEADER_ROW}", f"A{cur['n_rows']}:{last_col}"]
+    return [gspread.utils.absolute_range_name(title, r) for r in ranges] if title else ranges
+
+def apply_tail(store, name, cur, head_rng, tail_rng, expected_headers):
+    # 헤더와 커서 위치 행이 그대로면 새로 추가된 행만 저장하고 True. 바뀌었으면 False (전체 재동기화 필요).
+    head = _trim_row(head_rng[0]) if head_rng else []
+    if head != cur["header"] or not tail_rng or _trim_row(tail_rng[0]) != cur["last_row"]: return False
+    new_rows = [list(r) + [""] * (len(head) - len(r)) for r in tail_rng[1:]]
+    store.append_entries(name, cur["n_rows"] + 1, rows_to_records(new_rows, expected_headers),
+                         cur["n_rows"] + len(new_rows), _trim_row(new_rows[-1]) if new_rows else cur["last_row"])
+    return True
+
+def apply_full(store, name, all_values, expected_headers):
+    # 헤더/마지막 행은 증분 동기화가 읽는 범위(A:마지막 열)로 잘라 저장한다. 그 뒤 열에 값이 있어도 비교가 어긋나지 않게.
+    width = len(expected_headers)
+    header = _trim_row(all_values[SHEET_HEADER_ROW - 1][:width]) if len(all_values) >= SHEET_HEADER_ROW else None
+    store.replace_entries(name, SHEET_HEADER_ROW + 1, rows_to_records(all_values[SHEET_HEADER_ROW:], expected_headers),
+                          header, len(all_values), _trim_row(all_values[-1][:width]) if all_values else None)
+
+def sync_student_sheet(api, store, ws, name, expected_headers):
+    # 저장소의 커서(n_rows)부터 새로 추가된 행만 읽어 온다. 헤더나 커서 위치 행이 바뀌었으면 전체 재동기화.
+    cur = store.get_cursor(name)
+    ranges = tail_ranges(cur, expected_headers)
+    if ranges and apply_tail(store, name, cur, *api.call("batch_get", name, ws.batch_get, ranges), expected_headers): return
+    apply_full(store, name, api.call("get_all_values", name, ws.get_all_values), expected_headers)
+
+def sync_error_text(e):
+    # 동기화 실패 시 저장소와 오늘 자 요약에 남기는 오류 문자열
+    if isinstance(e, gspread.exceptions.APIError): return f"API 할당량({e.response.status_code})"
+    if isinstance(e, gspread.exceptions.SpreadsheetNotFound): return "시트 찾기 실패"
+    if isinstance(e, gspread.exceptions.WorksheetNotFound): return "워크시트 찾기 실패"
+    return f"알 수 없는 오류({type(e).__name__})"
+
+def sync_one_student(api, store, handles, name, url, expected_headers):
+    # 작업 스레드에서 실행되므로 st.* 호출 금지. 실패 시 오늘 자 요약에 쓰는 오류 문자열을 저장/반환한다.
+    if not url or not isinstance(url, str) or not url.startswith("http"): return "시트 URL 형식 오류"
+    error = None
+    try: sync_student_sheet(api, store, handles.worksheet(url, None, name), name, expected_headers)
+    except Exception as e:
+        error = sync_error_text(e)
+        handles.forget(url); store.set_sync_error(name, error)
+    return error
+
+def workbook_label(names):
+    return names[0] if len(names) == 1 else f"{names[0]} 외 {len(names) - 1}명"
+
+def batch_values(api, sh, ranges, label):
+    # values_batch_get을 WORKBOOK_BATCH_RANGES개씩 나눠 호출하고 범위 순서대로 값 목록을 돌려준다
+    out = []
+    for i in range(0, len(ranges), WORKBOOK_BATCH_RANGES):
+        resp = api.call("values_batch_get", label, sh.values_batch_get, ranges[i:i + WORKBOOK_BATCH_RANGES])
+        out.extend(vr.get("values", []) for vr in resp.get("valueRanges", []))
+    return out
+
+def sync_workbook(api, store, handles, url, members, expected_headers):
+    # 통합 문서 하나에 든 학생 워크시트들을 values_batch_get으로 함께 동기화. members: [(이름, 워크시트), ...]. {이름: 오류} 반환.
+    label = workbook_label([name for name, _ in members])
+    if not url or not isinstance(url, str) or not url.startswith("http"): return {name: "시트 URL 형식 오류" for name, _ in members}
+    errors = {}
+    try:
+        sh, titles = handles.spreadsheet(url, label), handles.worksheet_titles(url, label)
+        missing = [name for name, title in members if title not in titles]
+        if missing: # 워크시트가 새로 생겼을 수 있으니 목록을 한 번 다시 읽는다
+            handles.forget(url); sh, titles = handles.spreadsheet(url, label), handles.worksheet_titles(url, label)
+        for name, title in members:
+            if title not in titles: errors[name] = "워크시트 찾기 실패"
+        members = [(name, title) for name, title in members if name not in errors]
+        cursors = {name: store.get_cursor(name) for name, _ in members}
+        tail = [(name, title, tail_ranges(cursors[name], expected_headers, title)) for name, title in members]
+        full = [(name, title) for name, title, ranges in tail if not ranges]
+        tail = [(name, title, ranges) for name, title, ranges in tail if ranges]
+        if tail:
+            values = batch_values(api, sh, [r for _, _, ranges in tail for r in ranges], label)
+            for i, (name, title, _) in enumerate(tail):
+                if not apply_tail(store, name, cursors[name], values[2 * i], values[2 * i + 1], expected_headers): full.append((name, title))
+        if full:
+            # 학생 전용 시트의 get_all_values와 같이 워크시트 전체(모든 열)를 읽는다
+            values = batch_values(api, sh, [gspread.utils.absolute_range_name(title) for _, title in full], label)
+            # 값 API는 행 끝의 빈 칸을 잘라 보내므로 get_all_values처럼 같은 너비로 채운다
+            for (name, _), all_values in zip(full, values): apply_full(store, name, gspread.utils.fill_gaps(all_values) if all_values else [], expected_headers)
+    except Exception as e:
+        handles.forget(url)
+        errors.update({name: sync_error_text(e) for name, _ in members if name not in errors})
+    for name, error in errors.items(): store.set_sync_error(name, error)
+    return errors
+
+def sync_all_students(api, store, handles, expected_headers, max_workers, on_progress=None):
+    # 학생목록을 다시 읽고 모든 학생을 병렬로 증분 동기화. 학생 전용 시트는 학생 단위로, 통합 문서는 문서 단위로 한 작업씩.
+    # on_progress(done, total, name)는 호출한 스레드에서 불린다 (done/total은 학생 수).
+    store.replace_roster(*fetch_roster(api, handles))
+    roster_df = store.students_df()
+    jobs, workbooks = [], {}
+    for name, url, title in ([] if roster_df.empty else zip(roster_df["이름"], roster_df["시트URL"], roster_df["워크시트"])):
+        if isinstance(title, str) and title: workbooks.setdefault(url, []).append((name, title))
+        else: jobs.append(([name], sync_one_student, (api, store, handles, name, url, expected_headers)))
+    jobs += [([name for name, _ in members], sync_workbook, (api, store, handles, url, members, expected_headers)) for url, members in workbooks.items()]
+    total = sum(len(names) for names, _, _ in jobs)
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+            # 호출 기록에 화면 실행 번호가 이어지도록 컨텍스트를 복사해서 넘긴다
+            futures = {pool.submit(contextvars.copy_context().run, fn, *args): names for names, fn, args in jobs}
+            done = 0
+            for fut in as_completed(futures):
+                fut.result(); done += len(futures[fut])
+                if on_progress: on_progress(done, total, workbook_label(futures[fut]))
+    store.mark_class_synced()
+
+class SyncWorker:
+    # 일정 주기로 전체 학생을 동기화하는 백그라운드 작업. 화면의 새로고침 동기화와 동시에 돌지 않도록 run_lock을 공유한다.
+    def __init__(self, api, store, handles, interval_sec, max_workers):
+        self.api, self.store, self.handles, self.interval_sec, self.max_workers = api, store, handles, interval_sec, max_workers
+        self.run_lock, self.wake = threading.Lock(), threading.Event()
+        self.status = {"running": False, "done": 0, "total": 0, "finished_at": None, "error": None}
+        threading.Thread(target=self._loop, daemon=True, name="diary-sync").start()
+
+    def _loop(self):
+        while True:
+            self.wake.wait(self.interval_sec); self.wake.clear()
+            try: self.sync_now()
+            except Exception: pass  # 오류는 status에 기록됨
+
+    def sync_now(self, on_progress=None):
+        with self.run_lock:
+            self.status.update(running=True, done=0, total=0, error=None)
+            def _progress(done, total, name):
+                self.status.update(done=done, total=total)
+                if on_progress: on_progress(done, total, name)
+            try: sync_all_students(self.api, self.store, self.handles, EXPECTED_STUDENT_SHEET_HEADER, self.max_workers, _progress)
+            except Exception as e: self.status["error"] = f"{type(e).__name__}: {e}"; raise
+            finally: self.status.update(running=False, finished_at=time.time())
+
+class NoteFlusher:
+    # 저장소의 쪽지 대기열을 주기적으로 비우는 백그라운드 작업. 스프레드시트(통합 문서 포함)마다 values_batch_update 한 번으로 모아 쓴다.
+    def __init__(self, api, store, handles, delay_sec, max_attempts):
+        self.api, self.store, self.handles, self.delay_sec, self.max_attempts = api, store, handles, delay_sec, max_attempts
+        self.run_lock = threading.Lock()
+        threading.Thread(target=self._loop, daemon=True, name="note-flush").start()
+
+    def _loop(self):
+        while True:
+            time.sleep(1)
+            try: self.flush()
+            except Exception: pass  # 항목별 오류는 대기열에 기록됨
+
+    def flush(self, force=False):
+        with self.run_lock:
+            items = self.store.claim_due_notes(0 if force else self.delay_sec, self.max_attempts, force)
+            by_url = {}
+            for it in items: by_url.setdefault(it["sheet_url"], []).append(it)
+            for url, group in by_url.items():
+                label = workbook_label(sorted({it["student"] for it in group}))
+                try:
+                    sh = self.handles.spreadsheet(url, label)
+                    data = [{"range": gspread.utils.absolute_range_name(it["worksheet"] or self.handles.worksheet(url, None, label).title,
+                                                                        gspread.utils.rowcol_to_a1(it["row_num"], self.store.note_column(it["student"]))),
+                             "values": [[it["note"]]]} for it in group]
+                    self.api.call("values_batch_update", label, sh.values_batch_update, {"valueInputOption": "RAW", "data": data})
+                    self.store.mark_notes_flushed(group)
+                except Exception as e:
+                    self.handles.forget(url)
+                    attempts = max(it["attempts"] for it in group) + 1
+                    self.store.mark_notes_failed(group, f"{type(e).__name__}: {e}",
+                                                 min(FETCH_BACKOFF_MAX_SEC * 4, FETCH_BACKOFF_BASE_SEC * 2 ** attempts) * random.uniform(1, 2))
+            return len(items)
+
+@st.cache_resource
+def get_diary_store():
+    return DiaryStore(st.secrets.get("DIARY_DB_PATH", DIARY_DB_PATH))
+
+@st.cache_resource
+def get_record_cache():
+    return RecordCache(int(float(st.secrets.get("RECORD_CACHE_BUDGET_MB", RECORD_CACHE_BUDGET_MB)) * 1024 * 1024))
+
+@st.cache_resource
+def get_sheet_handles(_client_gspread):
+    return SheetHandles(get_sheets_api(), _client_gspread)
+
+@st.cache_resource
+def get_sync_worker(_client_gspread):
+    return SyncWorker(get_sheets_api(), get_diary_store(), get_sheet_handles(_client_gspread),
+                      st.secrets.get("SYNC_INTERVAL_SEC", SYNC_INTERVAL_SEC), int(st.secrets.get("FETCH_MAX_WORKERS", FETCH_MAX_WORKERS)))
+
+@st.cache_resource
+def get_note_flusher(_client_gspread):
+    return NoteFlusher(get_sheets_api(), get_diary_store(), get_sheet_handles(_client_gspread), NOTE_FLUSH_DELAY_SEC, NOTE_MAX_ATTEMPTS)
+
+@st.cache_resource
+def get_class_gpt_batch(_api_key):
+    return ClassGptBatch(get_diary_store(), get_api_metrics(), _api_key, int(st.secrets.get("GPT_BATCH_CONCURRENCY", GPT_BATCH_CONCURRENCY)),
+                         int(st.secrets.get("OPENAI_RPM_LIMIT", OPENAI_RPM_LIMIT)), int(st.secrets.get("OPENAI_TPM_LIMIT", OPENAI_TPM_LIMIT)),
+                         int(st.secrets.get("GPT_INPUT_TOKEN_BUDGET", GPT_INPUT_TOKEN_BUDGET)))
+
+@st.cache_data(max_entries=200)
+def render_wordcloud_png(student_name, data_version):
+    # 저장소에 쌓아 둔 단어 빈도로 그린다. (학생, 데이터 버전)이 같으면 PNG를 그대로 재사용.
+    freqs = get_diary_store().term_frequencies(student_name)
+    if not freqs: return None
+    from wordcloud import WordCloud  # matplotlib까지 불러와 무거우므로 처음 그릴 때 import
+    wc = WordCloud(font_path=FONT_PATH, width=700, height=350, background_color="white").generate_from_frequencies(freqs)
+    buf = io.BytesIO(); wc.to_image().save(buf, format="PNG")
+    return buf.getvalue()
+
+def run_foreground_sync(worker):
+    progress = st.progress(0.0, text="전체 학생 일기 동기화 중...")
+    try: worker.sync_now(lambda done, total, name: progress.progress(done / total, text=f"동기화 중... ({done}/{total}) {name} 완료"))
+    except Exception as e: st.error(f"학생 데이터 동기화 오류: {e}")
+    progress.empty()
+
+@st.cache_data(ttl=300)
+def fetch_all_students_today_data(_students_df, today_str, data_version):
+    # 로컬 저장소 조회만 하므로 빠르다. data_version이 바뀌면(동기화/쪽지 저장) 다시 계산된다.
+    get_api_metrics().cache_miss("fetch_all_students_today_data")
+    if _students_df.empty: return []
+    return get_diary_store().today_summary(today_str)
+
+@st.cache_data(max_entries=4)
+def today_emotion_board(_summary_data, today_str, data_version):
+    # 탭1: 오늘 감정 대분류별 학생 (정렬된 목록). 요약과 같은 키라서 다른 탭을 조작하는 재실행에서는 다시 만들지 않는다.
+    get_api_metrics().cache_miss("today_emotion_board")
+    cats = {g: [] for g in EMOTION_GROUPS}; cats.update({"감정 미분류": [], "일기 미제출 또는 오류": []})
+    for d in _summary_data:
+        name = d["name"]
+        if d["error"] and d["error"] != "오늘 일기 없음": cats["일기 미제출 또는 오류"].append(f"{name} ({d['error']})")
+        elif d["error"] == "오늘 일기 없음" or not d["emotion_today"]: cats["일기 미제출 또는 오류"].append(name)
+        elif d["emotion_today"] and isinstance(d["emotion_today"], str) and " - " in d["emotion_today"]:
+            main_emo = d["emotion_today"].split(" - ")[0].strip()
+            if main_emo in EMOTION_GROUPS: cats[main_emo].append(name)
+            else: cats["감정 미분류"].append(f"{name} (감정: {d['emotion_today']})")
+        else: cats["일기 미제출 또는 오류"].append(f"{name} (감정 형식 오류: {d['emotion_today']})")
+    return {grp: sorted(names) for grp, names in cats.items()}
+
+@st.cache_data(max_entries=4)
+def today_messages(_summary_data, today_str, data_version):
+    # 탭2: 오늘 '하고 싶은 말'을 남긴 학생을 (부정, 긍정/보통)으로 나눠 이름순으로
+    get_api_metrics().cache_miss("today_messages")
+    neg_msg, other_msg = [], []
+    for d in _summary_data:
+        if d["error"] or not d["emotion_today"] or not d["message_today"] or not d["message_today"].strip(): continue
+        emo_f = d["emotion_today"]
+        if not isinstance(emo_f, str) or " - " not in emo_f: continue
+        item = {"name": d["name"], "emotion": emo_f, "message": d["message_today"].strip()}
+        if emo_f.split(" - ")[0].strip() == "😢 부정": neg_msg.append(item)
+        elif emo_f.split(" - ")[0].strip() in EMOTION_GROUPS[:2]: other_msg.append(item) # 긍정, 보통
+    return sorted(neg_msg, key=lambda x: x["name"]), sorted(other_msg, key=lambda x: x["name"])
+
+@st.cache_data(max_entries=2)
+def get_emotion_frame(data_version):
+    # 학급 전체 (student, date, emotion_group) 표. 저장소 옆 Parquet 파일을 재사용하고 내용이 바뀌었을 때만 다시 만든다.
+    store = get_diary_store()
+    return load_emotion_frame(store, f"{store.path}.emotions.parquet")
+
+@st.cache_data(max_entries=20)
+def get_class_trends(data_version, start, end, n_students, skip_weekends, min_neg_days):
+    return class_trends(get_emotion_frame(data_version), start, end, n_students, skip_weekends, min_neg_days)
 
 # --- OpenAI API 클라이언트 ---
-client_openai = None
 openai_api_key = st.secrets.get("OPENAI_API_KEY")
-if openai_api_key:
-    try: client_openai = OpenAI(api_key=openai_api_key)
-    except Exception as e: st.warning(f"OpenAI 클라이언트 초기화 실패: {e}")
+
+@st.cache_resource
+def get_openai_client(_api_key):
+    # openai 모듈은 import가 무거워 GPT 분석을 처음 실행할 때 불러오고, 클라이언트는 프로세스에서 하나만 만든다
+    from openai import OpenAI
+    return OpenAI(api_key=_api_key)
+
+# --- GPT 누적 분석 ---
+def format_gpt_data(records):
+    c_emo = [f"일자({r.get('날짜','')}): {r.get('감정','')}" for r in records if r.get('감정')]
+    c_grat = [f"일자({r.get('날짜','')}): {r.get('감사한 일','')}" for r in records if (r.get('감사한 일') or '').strip()]
+    c_msg = [f"일자({r.get('날짜','')}): {r.get('하고 싶은 말','')}" for r in records if (r.get('하고 싶은 말') or '').strip()]
+    return (f"### 전체 감정:\n" + ("\n".join(c_emo) if c_emo else "기록 없음") + "\n\n"
+            f"### 전체 감사한 일:\n" + ("\n".join(c_grat) if c_grat else "기록 없음") + "\n\n"
+            f"### 전체 하고 싶은 말:\n" + ("\n".join(c_msg) if c_msg else "기록 없음"))
+
+def estimate_tokens(text):
+    # tiktoken 없이 보수적으로 추정: 한글 등 비ASCII 문자는 1자 1토큰, ASCII는 4자 1토큰
+    n_ascii = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - n_ascii) + n_ascii // 4 + 1
+
+def _sha256(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def build_cumulative_messages(gpt_data):
+    prompt_parts = GPT_CUMULATIVE_SYSTEM_PROMPT.split("학생의 누적 기록 데이터:")
+    sys_instr = prompt_parts[0].strip()
+    user_req_tmpl = "학생의 누적 기록 데이터:" + prompt_parts[1]
+    return [{"role": "system", "content": sys_instr},
+            {"role": "user", "content": user_req_tmpl.format(cumulative_diary_data_for_gpt=gpt_data)}]
+
+def check_token_budget(messages, max_output_tokens, budget):
+    # 요청 전에 입력 토큰 추정치가 예산과 모델 컨텍스트 안에 드는지 확인
+    n_in = sum(estimate_tokens(m["content"]) for m in messages)
+    if n_in > budget or n_in + max_output_tokens > GPT_CONTEXT_TOKENS:
+        raise ValueError(f"입력이 약 {n_in:,} 토큰으로 예산({budget:,})을 넘습니다. 증분 분석을 사용하세요.")
+    return n_in
+
+async def update_gpt_digest(complete, store, name, older, budget):
+    # older(오래된 기록)를 누적 요약 하나로 유지. 이미 요약된 행은 다시 보내지 않고 새 행만 이전 요약에 합친다.
+    if not older: return ""
+    dg = store.get_gpt_digest(name)
+    if dg and dg["prompt_version"] == GPT_PROMPT_VERSION and dg["model"] == GPT_DIGEST_MODEL:
+        covered = [r for r in older if r["_row"] <= dg["through_row"]]
+        if _sha256(format_gpt_data(covered)) != dg["source_hash"]: dg = None  # 이전 기록이 바뀌면 처음부터
+    else: dg = None
+    todo = [r for r in older if not dg or r["_row"] > dg["through_row"]]
+    digest = dg["digest"] if dg else ""
+    if not todo: return digest
+    chunks, chunk, chunk_tokens = [], [], estimate_tokens(digest)
+    for rec in todo: # 한 번의 요약 요청도 예산 안에 들도록 나눈다
+        rec_tokens = estimate_tokens(format_gpt_data([rec]))
+        if chunk and chunk_tokens + rec_tokens > budget: chunks.append(chunk); chunk, chunk_tokens = [], estimate_tokens(digest)
+        chunk.append(rec); chunk_tokens += rec_tokens
+    chunks.append(chunk)
+    for chunk in chunks:
+        messages = [{"role": "system", "content": GPT_DIGEST_SYSTEM_PROMPT.strip()},
+                    {"role": "user", "content": f"[이전 요약]\n{digest or '없음'}\n\n[새 기록]\n{format_gpt_data(chunk)}"}]
+        check_token_budget(messages, GPT_DIGEST_MAX_TOKENS, budget + GPT_DIGEST_MAX_TOKENS)
+        resp = await complete(model=GPT_DIGEST_MODEL, messages=messages, temperature=0.3, max_tokens=GPT_DIGEST_MAX_TOKENS)
+        digest = resp.choices[0].message.content
+    store.put_gpt_digest(name, older[-1]["_row"], older[-1].get("날짜"), _sha256(format_gpt_data(older)), digest,
+                         GPT_DIGEST_MODEL, GPT_PROMPT_VERSION)
+    return digest
+
+async def get_cumulative_report(complete, store, name, records, incremental=False, budget=GPT_INPUT_TOKEN_BUDGET):
+    # (리포트, 저장된 리포트 dict 또는 None, 리포트 key) 반환. 같은 입력이면 API를 호출하지 않는다.
+    # complete는 chat.completions.create와 같은 인자를 받는 코루틴 함수 (단건은 동기 클라이언트 래핑, 학급 일괄은 AsyncOpenAI)
+    mode = "incremental" if incremental and len(records) > GPT_RECENT_ENTRIES else "full"
+    if mode == "incremental":
+        older, recent = records[:-GPT_RECENT_ENTRIES], records[-GPT_RECENT_ENTRIES:]
+        digest = await update_gpt_digest(complete, store, name, older, budget // 2)
+        gpt_data = (f"### 이전 기록 누적 요약 ({older[0].get('날짜')} ~ {older[-1].get('날짜')}, {len(older)}건):\n{digest}\n\n"
+                    f"아래는 그 이후의 최근 기록 원문입니다.\n\n" + format_gpt_data(recent))
+    else: gpt_data = format_gpt_data(records)
+    key = _sha256(GPT_MODEL, GPT_PROMPT_VERSION, mode, gpt_data)
+    cached = store.get_gpt_report(key)
+    if cached: return cached["report"], cached, key
+    messages = build_cumulative_messages(gpt_data)
+    check_token_budget(messages, GPT_MAX_OUTPUT_TOKENS, budget)
+    gpt_resp = await complete(model=GPT_MODEL, messages=messages, temperature=0.7, max_tokens=GPT_MAX_OUTPUT_TOKENS)
+    report = gpt_resp.choices[0].message.content
+    store.put_gpt_report(key, name, GPT_MODEL, GPT_PROMPT_VERSION, mode, report, records[-1]["_row"] if records else None)
+    return report, None, key
+
+def sync_completer(client):
+    # 동기 OpenAI 클라이언트를 get_cumulative_report용 코루틴 함수로 (탭3 단건 분석)
+    async def complete(**kwargs): return client.chat.completions.create(**kwargs)
+    return complete
+
+def timed_completer(metrics, name, complete):
+    # complete 호출마다 지연/상태/토큰 사용량을 metrics에 남긴다 (재시도는 SDK 내부에서 처리되어 세지 않음)
+    async def timed(**kwargs):
+        started, status, resp = time.perf_counter(), None, None
+        try:
+            resp = await complete(**kwargs); status = 200
+            return resp
+        except Exception as e:
+            status = getattr(e, "status_code", None) or type(e).__name__; raise
+        finally:
+            usage = getattr(resp, "usage", None)
+            metrics.record("openai", f"chat.completions:{kwargs.get('model')}", name, started, status, 0, payload_bytes(kwargs.get("messages")),
+                           prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0, completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+    return timed
+
+class GptBatchStopped(Exception):
+    # 학급 일괄 분석 중지: 요청을 보내기 직전에 확인해 남은 학생을 pending으로 둔다
+    pass
+
+class ClassGptBatch:
+    # 학급 전체 GPT 분석을 백그라운드 스레드의 asyncio 루프에서 실행. 항목 상태는 저장소에 있어 언제든 이어서 실행할 수 있다.
+    def __init__(self, store, metrics, api_key, concurrency, rpm, tpm, budget):
+        self.store, self.metrics, self.api_key, self.concurrency, self.budget = store, metrics, api_key, concurrency, budget
+        self.rpm, self.tpm = TokenBucket(rpm), TokenBucket(tpm)
+        self.thread, self.stop_event = None, threading.Event()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, job_id, incremental):
+        if self.is_running(): return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=asyncio.run, args=(self._run(job_id, incremental),), daemon=True, name="gpt-batch")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    async def _run(self, job_id, incremental):
+        from openai import AsyncOpenAI
+        aclient = AsyncOpenAI(api_key=self.api_key, max_retries=4)  # 429/5xx는 SDK가 백오프하며 재시도
+        sem = asyncio.Semaphore(self.concurrency)
+
+        def completer(name):
+            create = timed_completer(self.metrics, name, aclient.chat.completions.create)
+            async def complete(**kwargs):
+                # 모든 학생 작업이 한꺼번에 시작되므로 세마포어/할당량을 기다린 뒤 보내기 직전에 중지 여부를 본다 (누적 요약 조각마다 포함)
+                async with sem:
+                    n_tokens = sum(estimate_tokens(m["content"]) for m in kwargs["messages"]) + kwargs.get("max_tokens", 0)
+                    if not (await self.rpm.acquire_async(1, self.stop_event) and await self.tpm.acquire_async(n_tokens, self.stop_event)):
+                        raise GptBatchStopped()
+                    if self.stop_event.is_set(): raise GptBatchStopped()
+                    return await create(**kwargs)
+            return complete
+
+        async def one(name):
+            if self.stop_event.is_set(): return  # 중지하면 남은 학생은 pending으로 남아 이어서 실행 가능
+            try:
+                records = self.store.student_records(name)
+                if not records: self.store.set_gpt_job_item(job_id, name, "failed", error="기록 없음"); return
+                _, _, key = await get_cumulative_report(completer(name), self.store, name, records, incremental, self.budget)
+                self.store.set_gpt_job_item(job_id, name, "done", report_key=key)
+            except GptBatchStopped: pass
+            except Exception as e: self.store.set_gpt_job_item(job_id, name, "failed", error=f"{type(e).__name__}: {e}")
+
+        try: await asyncio.gather(*(one(name) for name in self.store.gpt_job_todo(job_id)))
+        finally:
+            await aclient.close()
+            self.store.set_gpt_job_status(job_id, "stopped" if self.stop_event.is_set() else "done")
 
 # --- 세션 상태 ---
 session_defaults = {
     "teacher_logged_in": False, "all_students_today_data_loaded": False,
     "all_students_today_data": [], "detail_view_selected_student": "",
-    "tab3_student_data_cache": {}
+    "force_sync": False
 }
 for k, v in session_defaults.items():
     if k not in st.session_state: st.session_state[k] = v
 
+def gpt_batch_panel(store, gpt_batch, student_names):
+    # 사이드바의 학급 전체 GPT 분석 패널. 실행 중에는 fragment로 이 부분만 주기적으로 다시 그린다.
+    job, running = store.latest_gpt_job(), gpt_batch.is_running()
+    if st.session_state.get("gpt_batch_polling") and not running:
+        st.session_state.gpt_batch_polling = False; st.rerun()  # 끝나면 전체를 다시 그려 폴링 중지
+    st.markdown("**🤖 학급 전체 GPT 분석**")
+    if job:
+        done, failed = job["counts"].get("done", 0), job["counts"].get("failed", 0)
+        remaining = job["total"] - done
+        st.progress(done / job["total"] if job["total"] else 0.0, text=f"완료 {done}/{job['total']}" + (f" · 실패 {failed}" if failed else ""))
+        if running: st.caption("분석 중... 다른 화면을 계속 사용할 수 있습니다.")
+        elif remaining: st.caption(f"중단됨 · 남은 학생 {remaining}명 (실패 포함)")
+    if running:
+        if st.button("분석 중지", key="gpt_batch_stop_btn"): gpt_batch.stop()
+        return
+    incremental = st.checkbox("증분 분석", value=True, key="gpt_batch_incr", help="오래된 기록은 학생별 누적 요약으로 전달합니다.")
+    if st.button("학급 전체 분석 시작", key="gpt_batch_start_btn") and student_names:
+        gpt_batch.start(store.create_gpt_job(student_names, incremental), incremental)
+        st.session_state.gpt_batch_polling = True; st.rerun()
+    if job and job["total"] - job["counts"].get("done", 0) and st.button("이어서 실행", key="gpt_batch_resume_btn"):
+        store.set_gpt_job_status(job["job_id"], "running")
+        gpt_batch.start(job["job_id"], bool(job["incremental"]))
+        st.session_state.gpt_batch_polling = True; st.rerun()
+
+def api_metrics_panel(metrics, rerun_id, record_cache):
+    # 관리자용 API 호출 현황: 이번 화면 실행 / 최근 1분 호출 수와 할당량, 느린 학생 시트, 캐시 적중률, 기록 내보내기
+    events = pd.DataFrame(metrics.snapshot(), columns=EVENT_FIELDS)
+    sheets_ev, gpt_ev = events[events["service"] == "sheets"], events[events["service"] == "openai"]
+    this_run = events[events["rerun"] == rerun_id]
+    run_sheets = this_run[this_run["service"] == "sheets"]
+    st.caption(f"이번 화면 실행: Sheets {len(run_sheets)}건 (재시도 {int(run_sheets['retries'].sum())}건, {run_sheets['latency_ms'].sum():,.0f}ms) · "
+               f"OpenAI {int((this_run['service'] == 'openai').sum())}건")
+    minute_ago = time.time() - 60
+    recent_sheets, recent_gpt = sheets_ev[sheets_ev["ts"] >= minute_ago], gpt_ev[gpt_ev["ts"] >= minute_ago]
+    quota = st.secrets.get("SHEETS_READ_QUOTA_PER_MIN", SHEETS_READ_QUOTA_PER_MIN)
+    n_attempts = len(recent_sheets) + int(recent_sheets["retries"].sum())  # 재시도도 할당량을 쓴다
+    n_failed = int((recent_sheets["status"] != 200).sum())
+    st.progress(min(1.0, n_attempts / quota) if quota else 0.0, text=f"최근 1분 Sheets 요청 {n_attempts}/{quota}" + (f" · 실패 {n_failed}건" if n_failed else ""))
+    if len(gpt_ev):
+        n_tokens = int(recent_gpt["prompt_tokens"].sum() + recent_gpt["completion_tokens"].sum())
+        st.caption(f"최근 1분 OpenAI 요청 {len(recent_gpt)}/{st.secrets.get('OPENAI_RPM_LIMIT', OPENAI_RPM_LIMIT)} · "
+                   f"토큰 {n_tokens:,}/{int(st.secrets.get('OPENAI_TPM_LIMIT', OPENAI_TPM_LIMIT)):,} (누적 {int(gpt_ev['prompt_tokens'].sum() + gpt_ev['completion_tokens'].sum()):,})")
+    if len(sheets_ev):
+        st.markdown("**느린 학생 시트**")
+        slowest = (sheets_ev.groupby("sheet").agg(호출=("op", "size"), 평균_ms=("latency_ms", "mean"), 최대_ms=("latency_ms", "max"),
+                                                   재시도=("retries", "sum"), KB=("bytes", "sum"))
+                   .sort_values("최대_ms", ascending=False).head(API_METRICS_SLOWEST_SHEETS))
+        slowest["KB"] = slowest["KB"] / 1024
+        st.dataframe(slowest.round(1))
+    for name, (n, hits) in metrics.cache_hit_rates().items():
+        st.caption(f"캐시 `{name}`: 적중률 {hits / n:.0%} ({hits}/{n})" if n else f"캐시 `{name}`: 조회 없음")
+    rc = record_cache.stats()
+    if rc["hits"] + rc["misses"]:
+        st.caption(f"학생 기록 공용 캐시: {rc['students']}명, {rc['nbytes'] / 2**20:.1f}/{rc['budget_bytes'] / 2**20:.0f}MB · "
+                   f"적중률 {rc['hits'] / (rc['hits'] + rc['misses']):.0%} ({rc['hits']}/{rc['hits'] + rc['misses']})" + (f" · 제거 {rc['evictions']}명" if rc["evictions"] else ""))
+    c1, c2 = st.columns(2)
+    with c1: st.download_button("JSON", data=metrics.to_json, file_name="api_calls.json", mime="application/json", key="api_metrics_json_btn")
+    with c2: st.download_button("CSV", data=metrics.to_csv, file_name="api_calls.csv", mime="text/csv", key="api_metrics_csv_btn")
+
+def workbook_migration_panel(api, store, handles, sync_worker, students_df):
+    # 학생 전용 시트 -> 통합 문서 옮기기 (관리자). 학생용 앱도 학생목록의 '워크시트' 열을 읽도록 되어 있어야 한다.
+    st.caption("학생별 스프레드시트를 통합 문서(학생마다 워크시트 1개)로 복사하고 학생목록을 바꿉니다. 동기화가 문서마다 요청 한두 번으로 줄어듭니다. "
+               "원래 시트는 그대로 두고 URL을 '이전시트URL' 열에 남깁니다.")
+    urls_text = st.text_area("대상 통합 문서 URL (한 줄에 하나)", key="migrate_urls",
+                             help="빈 스프레드시트를 만들어 서비스 계정 이메일에 편집 권한으로 공유한 뒤 붙여 넣으세요.")
+    plan = plan_migration(students_df, [u.strip() for u in urls_text.splitlines() if u.strip().startswith("http")])
+    n_single = 0 if students_df.empty else int(students_df["워크시트"].isna().sum())
+    if not plan:
+        st.caption(f"학생 전용 시트를 쓰는 학생 {n_single}명" + ("" if n_single else " - 옮길 학생이 없습니다."))
+        return
+    st.caption(f"학생 {len(plan)}명 → 통합 문서 {len({p[2] for p in plan})}개")
+    note_counts = store.note_queue_counts()
+    if note_counts.get("pending", 0) + note_counts.get("flushing", 0) + note_counts.get("failed", 0):
+        st.warning("시트에 아직 저장되지 않은 쪽지가 있습니다. 먼저 '쪽지 지금 저장'을 실행하세요."); return
+    st.warning("통합 후에는 학생목록의 시트URL이 통합 문서를 가리킵니다. 학생용 앱이 학생목록의 '워크시트' 열을 읽어 그 워크시트에 쓰도록 "
+               "먼저 바뀌어 있어야 합니다. 그렇지 않으면 학생들의 새 일기가 통합 문서의 첫 번째 워크시트에 잘못 저장됩니다.")
+    ack = st.checkbox("학생용 앱이 '워크시트' 열을 읽도록 업데이트되어 있음을 확인했습니다", key="migrate_student_app_ack")
+    confirm = st.checkbox("학생목록의 시트URL을 통합 문서로 바꾸는 데 동의합니다", key="migrate_confirm")
+    if st.button("통합 실행", key="migrate_btn", disabled=not (ack and confirm)):
+        progress = st.progress(0.0, text="학생 시트 복사 중...")
+        try:
+            with sync_worker.run_lock: # 복사하는 동안 백그라운드 동기화가 학생목록을 읽지 않도록
+                migrate_to_workbooks(api, handles, plan, EXPECTED_STUDENT_SHEET_HEADER,
+                                     lambda done, total, name: progress.progress(done / total, text=f"복사 중... ({done}/{total}) {name}"))
+        except Exception as e: st.error(f"통합 중 오류 (학생목록은 바뀌지 않았습니다. 다시 실행할 수 있습니다): {e}"); return
+        st.session_state.force_sync = True; st.rerun()
+
+def student_detail_tab(store, record_cache, students_df, api_metrics):
+    # 탭3 본문. fragment로 실행하므로 학생/날짜 선택 같은 이 탭의 위젯은 이 부분만 다시 실행한다 (학급 전체 탭은 다시 그리지 않음).
+    if students_df.empty: st.warning("학생 목록을 불러오세요.")
+    else:
+        s_opts = [""] + students_df["이름"].tolist()
+        s_idx = s_opts.index(st.session_state.detail_view_selected_student) if st.session_state.detail_view_selected_student in s_opts else 0
+        st.session_state.detail_view_selected_student = st.selectbox("학생 선택", options=s_opts, index=s_idx, key="sel_student_tab3_vfinal")
+        
+        sel_s_name = st.session_state.detail_view_selected_student
+        if sel_s_name:
+            s_info = students_df[students_df["이름"] == sel_s_name].iloc[0]
+            s_name, s_url = s_info["이름"], s_info["시트URL"]
+            
+            b_col, d_col = st.columns([0.25, 0.75])
+            with b_col:
+                if st.button("다른 학생", key=f"back_btn_final_{s_name}"):
+                    st.session_state.detail_view_selected_student = ""; st.rerun()
+            with d_col:
+                sel_date = st.date_input("날짜", value=datetime.today(), key=f"date_pick_final_{s_name}", label_visibility="collapsed")
+            sel_date_str = sel_date.strftime("%Y-%m-%d")
+
+            if not s_url or not isinstance(s_url, str) or not s_url.startswith("http"):
+                st.error(f"'{s_name}' 학생 시트 URL 오류.")
+            else:
+                # --- Main try-except for student sheet processing ---
+                try:
+                    # 모든 세션이 공유하는 기록 캐시에서 가져온다 (학생 데이터가 동기화/쪽지 저장으로 바뀌면 version이 달라져 다시 로드)
+                    s_version = store.student_version(s_name)
+                    s_records = record_cache.get(s_name, s_version, lambda: store.student_records(s_name))
+                    s_sync = store.student_sync_info(s_name) or {}
+                    if s_sync.get("sync_error"): st.caption(f"⚠️ 마지막 동기화 실패: {s_sync['sync_error']} (저장된 기록을 표시합니다)")
+
+                    if not s_records:
+                        st.warning(f"'{s_name}' 학생 시트에 유효한 데이터가 없습니다.")
+                    else:
+                        day_entries = s_records.entries(sel_date_str)
+                        if day_entries: # 선택한 날짜에 일기가 있는 경우
+                            diary_e, entry_key = s_records.primary(sel_date_str), f"{s_name}_{sel_date_str}"
+                            if len(day_entries) > 1: # 같은 날짜에 여러 건이면 어느 행인지 직접 고르게 한다
+                                st.warning(f"{sel_date_str}에 작성된 일기가 {len(day_entries)}건 있습니다. 기본으로 가장 나중 항목을 표시합니다.")
+                                dup_rows = [e["_row"] for e in day_entries]
+                                picked_row = st.radio("표시할 일기", dup_rows, index=len(dup_rows) - 1, horizontal=True,
+                                                      format_func=lambda r: f"시트 {r}행", key=f"dup_pick_{entry_key}")
+                                diary_e, entry_key = s_records.at_row(picked_row), f"{entry_key}_{picked_row}"
+                            st.subheader(f"📘 {s_name} ({sel_date_str}) 일기"); st.divider()
+                            st.write(f"**감정:** {diary_e.get('감정', 'N/A')}")
+                            st.write(f"**감사한 일:** {diary_e.get('감사한 일', 'N/A')}") # Corrected here
+                            st.write(f"**하고 싶은 말:** {diary_e.get('하고 싶은 말', 'N/A')}")
+                            note_val = diary_e.get('선생님 쪽지', '')
+                            st.write(f"**선생님 쪽지:** {note_val}")
+
+                            note_q = store.note_status(s_name, diary_e["_row"])
+                            if note_q and note_q["status"] in ("pending", "flushing"): st.caption("⏳ 시트 저장 대기 중")
+                            elif note_q and note_q["status"] == "flushed": st.caption("✅ 시트에 저장됨")
+                            elif note_q and note_q["status"] == "failed":
+                                st.caption(f"⚠️ 시트 저장 실패 ({note_q['attempts']}회): {note_q['error']}" +
+                                           (" - 자동 재시도 예정" if note_q["attempts"] < NOTE_MAX_ATTEMPTS else " - 사이드바에서 다시 시도하세요"))
+
+                            note_in = st.text_area("✏️ 쪽지 작성/수정", value=note_val, key=f"note_in_key_{entry_key}")
+                            if st.button("💾 쪽지 저장", key=f"save_note_key_{entry_key}"):
+                                if not note_in.strip() and not note_val: st.warning("쪽지 내용이 비어있습니다.")
+                                else:
+                                    try: # Note saving try-except
+                                        # 시트 쓰기는 대기열에서 모아서 처리. 저장소와 공용 캐시는 그 칸만 갱신해 다시 불러오지 않는다
+                                        idx_save = diary_e["_row"]
+                                        new_version = store.enqueue_note(s_name, idx_save, s_url, note_in)
+                                        record_cache.note_written(s_name, idx_save, note_in, new_version)
+                                        st.success("쪽지 저장 완료! (시트에는 잠시 후 반영됩니다)"); st.rerun()
+                                    except Exception as e_save_note: st.error(f"쪽지 저장 오류: {e_save_note}")
+                        else: 
+                            st.info(f"'{s_name}' 학생은 {sel_date_str}에 작성한 일기가 없습니다.")
+
+                        # --- 학생 전체 기록 기반 분석 섹션 ---
+                        if s_records:
+                            st.markdown("---"); st.subheader("📊 학생 전체 기록 기반 분석")
+                            if st.button(f"{s_name} 전체 기록 누적 분석 (워드클라우드, 감정 통계)", key=f"cumul_btn_{s_name}"):
+                                df_s_all_entries = pd.DataFrame(s_records.columns)
+                                st.write("##### 전체 감정 통계 (긍정, 보통, 부정)")
+                                if "감정" in df_s_all_entries.columns and not df_s_all_entries["감정"].empty:
+                                    # parse_emotion_group과 같은 규칙을 열 단위 문자열 연산으로 (" - " 앞부분이 대분류)
+                                    emo_col = df_s_all_entries["감정"].astype("string")
+                                    main_emo = emo_col.str.split(" - ", n=1).str[0].str.strip().where(emo_col.str.contains(" - ", regex=False))
+                                    chart_srs = main_emo.value_counts().reindex(EMOTION_GROUPS, fill_value=0)
+                                    if not chart_srs.empty and chart_srs.sum() > 0: st.bar_chart(chart_srs)
+                                    else: st.info("차트에 표시할 유효한 감정 기록이 없습니다.")
+                                else: st.info("감정 데이터 부족.")
+                                
+                                st.write("##### 전체 '감사한 일' & '하고 싶은 말' 단어 분석 (워드클라우드)")
+                                try: wc_png = render_wordcloud_png(s_name, s_version)
+                                except Exception as e: st.error(f"워드클라우드 오류 (폰트: '{FONT_PATH}'): {e}")
+                                else:
+                                    if wc_png: st.image(wc_png)
+                                    else: st.info("워드클라우드용 단어 부족.")
+                            
+                            st.markdown("---") 
+                            st.subheader(f"🤖 {s_name} 학생 전체 기록 GPT 심층 분석") 
+                            latest_rep = store.latest_gpt_report(s_name)
+                            if latest_rep: # 학급 일괄 분석 등으로 이미 만든 리포트는 API 호출 없이 바로 연다
+                                n_new = sum(1 for r in s_records.rows if r > (latest_rep["through_row"] or 0))
+                                with st.expander(f"📄 저장된 리포트 ({datetime.fromtimestamp(latest_rep['created_at']).strftime('%Y-%m-%d %H:%M')}, "
+                                                 f"{'증분' if latest_rep['mode'] == 'incremental' else '전체'} 분석" + (f", 이후 새 일기 {n_new}건" if n_new else "") + ")"):
+                                    st.markdown(latest_rep["report"])
+                            gpt_incremental = st.toggle("증분 분석 (오래된 기록은 누적 요약으로 전달)", value=len(s_records) > GPT_RECENT_ENTRIES,
+                                                        key=f"gpt_incr_{s_name}", help=f"최근 {GPT_RECENT_ENTRIES}건만 원문으로 보내고 그 이전 기록은 저장된 요약을 사용합니다.")
+                            if st.button(f"GPT로 전체 기록 심층 분석 실행 📝", key=f"gpt_cumul_btn_{s_name}"):
+                                if not openai_api_key: st.error("OpenAI API 키 미설정.")
+                                else:
+                                    with st.spinner(f"GPT가 {s_name} 학생의 전체 기록을 분석 중... (시간 소요)"):
+                                        try:
+                                            gpt_res_text, gpt_cached, _ = asyncio.run(get_cumulative_report(
+                                                timed_completer(api_metrics, s_name, sync_completer(get_openai_client(openai_api_key))), store, s_name, s_records.records(), gpt_incremental,
+                                                int(st.secrets.get("GPT_INPUT_TOKEN_BUDGET", GPT_INPUT_TOKEN_BUDGET))))
+                                            st.markdown("##### 💡 GPT 누적 분석 리포트:")
+                                            if gpt_cached: st.caption(f"💾 기록이 바뀌지 않아 저장된 리포트를 표시합니다 (생성: {datetime.fromtimestamp(gpt_cached['created_at']).strftime('%Y-%m-%d %H:%M')})")
+                                            with st.expander("결과 보기", expanded=True): st.markdown(gpt_res_text)
+                                        except Exception as e: st.error(f"GPT 분석 오류: {e}")
+                        # End of "if s_records" for analyses
+                # This is the try block for individual student sheet processing (open, read, display, buttons)
+                except gspread.exceptions.SpreadsheetNotFound:
+                    st.error(f"'{s_name}' 학생 시트 URL({s_url})을 찾을 수 없습니다.")
+                except gspread.exceptions.APIError as ge_api_detail:
+                     st.error(f"Google Sheets API 오류 ({ge_api_detail.response.status_code})로 '{s_name}' 학생 데이터를 가져올 수 없습니다. 잠시 후 다시 시도해주세요.")
+                except Exception as e_detail_page: # This was the line for SyntaxError
+                    st.error(f"'{s_name}' 학생 데이터 처리 중 오류 발생: {type(e_detail_page).__name__} - {e_detail_page}")
+            # End of "if selected_student_name_final:"
+        else: # 학생 미선택 시
+            st.info("상단에서 학생을 선택하여 상세 내용을 확인하고 분석 기능을 사용하세요.")
+    # End of "if students_df.empty:" else
+
+def class_trends_tab(store, students_df):
+    # 탭4 본문. 기간/옵션을 바꿔도 이 부분만 다시 실행한다.
+    if students_df.empty: st.warning("학생 목록을 불러오세요.")
+    else:
+        today = datetime.today().date()
+        f1, f2, f3 = st.columns([0.5, 0.25, 0.25])
+        with f1: trend_range = st.date_input("조회 기간", value=(today - timedelta(days=TREND_DEFAULT_DAYS - 1), today), key="trend_range")
+        with f2: skip_weekends = st.toggle("주말 제외", value=True, key="trend_skip_weekends")
+        with f3: min_neg_days = st.number_input("부정 연속 기준(회)", min_value=2, max_value=14, value=TREND_NEG_RUN_DAYS, key="trend_neg_days")
+        if len(trend_range) < 2: st.info("끝 날짜를 선택하세요.")
+        else:
+            tr = get_class_trends(store.version, trend_range[0], trend_range[1], len(students_df), skip_weekends, int(min_neg_days))
+            if not tr["n_entries"]: st.info("이 기간에 작성된 일기가 없습니다.")
+            else:
+                totals = tr["daily"].sum()
+                m_cols = st.columns(1 + len(EMOTION_GROUPS))
+                m_cols[0].metric("평균 제출률", f"{tr['submission'].mean():.0%}")
+                for i, grp in enumerate(EMOTION_GROUPS): m_cols[i + 1].metric(grp, f"{totals[grp] / totals.sum():.0%}", f"{totals[grp]}건", delta_color="off")
+                st.subheader("일별 감정 분포")
+                st.bar_chart(tr["daily"], color=["#4caf50", "#ffc107", "#f44336", "#9e9e9e"])
+                st.subheader("일별 제출률")
+                st.line_chart(tr["submission"])
+                st.subheader("주별 감정 비율")
+                st.bar_chart(tr["weekly_share"], color=["#4caf50", "#ffc107", "#f44336", "#9e9e9e"])
+                st.dataframe(tr["weekly"].assign(제출=tr["weekly"].sum(axis=1)).rename(index=lambda d: d.strftime("%Y-%m-%d")))
+                st.subheader(f"😢 부정 감정이 {int(min_neg_days)}회 이상 연속된 학생")
+                st.caption("제출한 일기 순서 기준 (미제출일은 건너뜀). '진행 중'은 기간 내 마지막 일기까지 이어진 경우입니다.")
+                if tr["neg_runs"].empty: st.success("해당하는 학생이 없습니다. 😊")
+                else: st.dataframe(tr["neg_runs"].assign(시작=tr["neg_runs"]["시작"].dt.strftime("%Y-%m-%d"), 끝=tr["neg_runs"]["끝"].dt.strftime("%Y-%m-%d")), hide_index=True)
+
 # --- MAIN APP ---
 if not st.session_state.teacher_logged_in:
     st.title("🧑‍🏫 감정일기 로그인 (교사용)")
@@ -126,39 +932,65 @@ if not st.session_state.teacher_logged_in:
             st.session_state.teacher_logged_in = True
             for key_to_reset in session_defaults.keys():
                  if key_to_reset != "teacher_logged_in": st.session_state[key_to_reset] = session_defaults[key_to_reset]
-            st.cache_data.clear(); st.rerun()
+            st.rerun()
         else: st.error("비밀번호가 올바르지 않습니다.")
 else:
+    api_metrics = get_api_metrics()
+    rerun_id = api_metrics.begin_rerun()  # 이번 화면 실행에서 생긴 API 호출을 사이드바에서 따로 집계
     g_client = authorize_gspread()
-    students_df = get_students_df(g_client)
+    store, record_cache = get_diary_store(), get_record_cache()
+    sync_worker, note_flusher = get_sync_worker(g_client), get_note_flusher(g_client)
+    # 저장소가 한 번도 동기화되지 않았거나 새로고침을 눌렀을 때만 화면에서 기다리며 동기화. 그 외에는 백그라운드 작업이 갱신.
+    if g_client and (st.session_state.force_sync or store.class_synced_at() is None):
+        st.session_state.force_sync = False
+        run_foreground_sync(sync_worker)
+    api_metrics.cache_lookup("get_students_df")
+    students_df = get_students_df(g_client, store.version)
 
     st.sidebar.title("🧑‍🏫 교사 메뉴")
     if st.sidebar.button("로그아웃", key="logout_final_v4"):
         for k_reset in session_defaults.keys(): st.session_state[k_reset] = session_defaults[k_reset]
-        st.cache_data.clear(); st.rerun()
+        st.rerun()
     if st.sidebar.button("오늘 학생 데이터 새로고침 ♻️", key="refresh_data_final_v4"):
+        # 캐시는 비우지 않는다: 동기화로 바뀐 학생만 version이 올라가 그 학생의 캐시만 다시 만들어진다
         st.session_state.all_students_today_data_loaded = False
-        st.session_state.tab3_student_data_cache = {}
-        st.cache_data.clear(); st.rerun()
+        st.session_state.force_sync = True
+        st.rerun()
+    sync_status = sync_worker.status
+    if sync_status["running"]: st.sidebar.caption(f"🔄 백그라운드 동기화 중... ({sync_status['done']}/{sync_status['total']})")
+    elif store.class_synced_at(): st.sidebar.caption(f"🔄 마지막 동기화: {datetime.fromtimestamp(store.class_synced_at()).strftime('%H:%M:%S')}")
+    if sync_status["error"]: st.sidebar.caption(f"⚠️ 동기화 오류: {sync_status['error']}")
+    if openai_api_key and not students_df.empty:
+        gpt_batch = get_class_gpt_batch(openai_api_key)
+        with st.sidebar:
+            st.divider()
+            st.fragment(gpt_batch_panel, run_every=2 if gpt_batch.is_running() else None)(store, gpt_batch, students_df["이름"].tolist())
+    note_counts = store.note_queue_counts()
+    n_waiting, n_failed = note_counts.get("pending", 0) + note_counts.get("flushing", 0), note_counts.get("failed", 0)
+    if n_waiting or n_failed:
+        st.sidebar.caption(f"📝 쪽지 저장 대기 {n_waiting}건" + (f", ⚠️ 실패 {n_failed}건" if n_failed else ""))
+        if st.sidebar.button("쪽지 지금 저장 (실패 항목 포함)", key="flush_notes_btn"):
+            store.retry_failed_notes()
+            with st.spinner("쪽지를 시트에 저장 중..."): note_flusher.flush(force=True)
+            st.rerun()
 
     st.title("🧑‍🏫 교사용 대시보드")
+    for problem in store.roster_problems(): st.warning(problem)
 
-    if not st.session_state.all_students_today_data_loaded:
-        if students_df.empty:
-            if g_client: st.warning("'학생목록' 시트가 비었거나 접근 불가. 확인 후 새로고침.")
-            st.session_state.all_students_today_data = []
-            st.session_state.all_students_today_data_loaded = True
-        else:
-            today_str = datetime.today().strftime("%Y-%m-%d")
-            st.session_state.all_students_today_data = fetch_all_students_today_data(
-                students_df, today_str, g_client, EXPECTED_STUDENT_SHEET_HEADER)
-            st.session_state.all_students_today_data_loaded = True
-            if st.session_state.all_students_today_data or students_df.empty:
-                 st.success("오늘 자 학생 요약 정보 로드 완료!")
+    today_str = datetime.today().strftime("%Y-%m-%d")
+    if students_df.empty:
+        if not st.session_state.all_students_today_data_loaded and g_client: st.warning("'학생목록' 시트가 비었거나 접근 불가. 확인 후 새로고침.")
+        st.session_state.all_students_today_data = []
+    else:
+        api_metrics.cache_lookup("fetch_all_students_today_data")
+        st.session_state.all_students_today_data = fetch_all_students_today_data(students_df, today_str, store.version)
+        if not st.session_state.all_students_today_data_loaded and st.session_state.all_students_today_data:
+             st.success("오늘 자 학생 요약 정보 로드 완료!")
+    st.session_state.all_students_today_data_loaded = True
 
     summary_data = st.session_state.get("all_students_today_data", [])
-    tab_names = ["오늘의 학급 감정 분포 📊", "학생들이 전달하는 메시지 💌", "학생별 일기 상세 보기 📖"]
-    tab1, tab2, tab3 = st.tabs(tab_names)
+    tab_names = ["오늘의 학급 감정 분포 📊", "학생들이 전달하는 메시지 💌", "학생별 일기 상세 보기 📖", "학급 감정 추이 📈"]
+    tab1, tab2, tab3, tab4 = st.tabs(tab_names)
 
     with tab1:
         st.header(tab_names[0])
@@ -166,199 +998,55 @@ else:
         if not summary_data and not students_df.empty : st.info("요약 정보 로딩 중이거나, 새로고침 해보세요.")
         elif not summary_data and students_df.empty : st.warning("'학생목록'이 비어 표시할 내용이 없습니다.")
         else:
-            cats = {g: [] for g in EMOTION_GROUPS}; cats.update({"감정 미분류": [], "일기 미제출 또는 오류": []})
-            for d in summary_data:
-                name = d["name"]
-                if d["error"] and d["error"] != "오늘 일기 없음": cats["일기 미제출 또는 오류"].append(f"{name} ({d['error']})")
-                elif d["error"] == "오늘 일기 없음" or not d["emotion_today"]: cats["일기 미제출 또는 오류"].append(name)
-                elif d["emotion_today"] and isinstance(d["emotion_today"], str) and " - " in d["emotion_today"]:
-                    main_emo = d["emotion_today"].split(" - ")[0].strip()
-                    if main_emo in EMOTION_GROUPS: cats[main_emo].append(name)
-                    else: cats["감정 미분류"].append(f"{name} (감정: {d['emotion_today']})")
-                else: cats["일기 미제출 또는 오류"].append(f"{name} (감정 형식 오류: {d['emotion_today']})")
+            api_metrics.cache_lookup("today_emotion_board")
+            cats = today_emotion_board(summary_data, today_str, store.version)
             cols_t1 = st.columns(len(EMOTION_GROUPS))
             for i, grp in enumerate(EMOTION_GROUPS):
                 with cols_t1[i]:
                     st.subheader(f"{grp} ({len(cats[grp])}명)")
-                    if cats[grp]: st.markdown("\n".join([f"- {n}" for n in sorted(cats[grp])]))
+                    if cats[grp]: st.markdown("\n".join([f"- {n}" for n in cats[grp]]))
                     else: st.info("이 감정을 느낀 학생이 없습니다.")
             c1, c2 = st.columns(2)
             with c1:
                 if cats["일기 미제출 또는 오류"]:
                     with st.expander(f"📝 미제출/오류 ({len(cats['일기 미제출 또는 오류'])}명)"):
-                        st.markdown("\n".join([f"- {s}" for s in sorted(cats["일기 미제출 또는 오류"])]))
+                        st.markdown("\n".join([f"- {s}" for s in cats["일기 미제출 또는 오류"]]))
             with c2:
                 if cats["감정 미분류"]:
                     with st.expander(f"🤔 감정 미분류 ({len(cats['감정 미분류'])}명)"):
-                        st.markdown("\n".join([f"- {s}" for s in sorted(cats["감정 미분류"])]))
+                        st.markdown("\n".join([f"- {s}" for s in cats["감정 미분류"]]))
     with tab2:
         st.header(tab_names[1])
         if not summary_data and not students_df.empty: st.info("요약 정보 로딩 중이거나, 새로고침 해보세요.")
         elif not summary_data and students_df.empty : st.warning("'학생목록'이 비어 표시할 내용이 없습니다.")
         else:
-            neg_msg, other_msg = [], []
-            for d in summary_data:
-                if d["error"] or not d["emotion_today"] or not d["message_today"] or not d["message_today"].strip(): continue
-                emo_f = d["emotion_today"]
-                if not isinstance(emo_f, str) or " - " not in emo_f: continue
-                item = {"name": d["name"], "emotion": emo_f, "message": d["message_today"].strip()}
-                if emo_f.split(" - ")[0].strip() == "😢 부정": neg_msg.append(item)
-                elif emo_f.split(" - ")[0].strip() in EMOTION_GROUPS[:2]: other_msg.append(item) # 긍정, 보통
+            api_metrics.cache_lookup("today_messages")
+            neg_msg, other_msg = today_messages(summary_data, today_str, store.version)
             if not neg_msg and not other_msg: st.success("오늘 하고 싶은 말을 남긴 학생이 없습니다. 😊")
             else:
                 st.subheader("😥 부정적 감정 학생 & 메시지")
                 if neg_msg:
-                    for item in sorted(neg_msg,key=lambda x:x['name']): 
+                    for item in neg_msg:
                         with st.container(border=True): st.markdown(f"**{item['name']}** (<span style='color:red;'>{item['emotion']}</span>)\n\n> {item['message']}", unsafe_allow_html=True)
                 else: st.info("부정적 감정과 메시지를 함께 남긴 학생 없음.")
                 st.markdown("---")
                 st.subheader("😊 그 외 감정 학생 & 메시지")
                 if other_msg:
-                    for item in sorted(other_msg,key=lambda x:x['name']): 
+                    for item in other_msg:
                         with st.container(border=True): st.markdown(f"**{item['name']}** ({item['emotion']})\n\n> {item['message']}")
                 else: st.info("긍정/보통 감정과 메시지를 함께 남긴 학생 없음.")
 
     with tab3: # 학생별 일기 상세 보기
         st.header(tab_names[2])
-        if students_df.empty: st.warning("학생 목록을 불러오세요.")
-        else:
-            s_opts = [""] + students_df["이름"].tolist()
-            s_idx = s_opts.index(st.session_state.detail_view_selected_student) if st.session_state.detail_view_selected_student in s_opts else 0
-            st.session_state.detail_view_selected_student = st.selectbox("학생 선택", options=s_opts, index=s_idx, key="sel_student_tab3_vfinal")
-            
-            sel_s_name = st.session_state.detail_view_selected_student
-            if sel_s_name:
-                s_info = students_df[students_df["이름"] == sel_s_name].iloc[0]
-                s_name, s_url = s_info["이름"], s_info["시트URL"]
-                
-                b_col, d_col = st.columns([0.25, 0.75])
-                with b_col:
-                    if st.button("다른 학생", key=f"back_btn_final_{s_name}"):
-                        st.session_state.detail_view_selected_student = ""; st.rerun()
-                with d_col:
-                    sel_date = st.date_input("날짜", value=datetime.today(), key=f"date_pick_final_{s_name}", label_visibility="collapsed")
-                sel_date_str = sel_date.strftime("%Y-%m-%d")
-
-                if not s_url or not isinstance(s_url, str) or not s_url.startswith("http"):
-                    st.error(f"'{s_name}' 학생 시트 URL 오류.")
-                else:
-                    # --- Main try-except for student sheet processing ---
-                    try:
-                        df_s_all_entries, all_s_entries_list = None, []
-                        # 캐시 확인 또는 데이터 로드
-                        if s_name in st.session_state.tab3_student_data_cache:
-                            cached_s_data = st.session_state.tab3_student_data_cache[s_name]
-                            df_s_all_entries, all_s_entries_list = cached_s_data['df'], cached_s_data['list']
-                        else:
-                            with st.spinner(f"'{s_name}' 학생 전체 기록 로딩 중..."):
-                                ws_s = g_client.open_by_url(s_url).sheet1
-                                all_s_entries_list = get_records_from_row2_header(ws_s, EXPECTED_STUDENT_SHEET_HEADER)
-                                df_s_all_entries = pd.DataFrame(all_s_entries_list)
-                                st.session_state.tab3_student_data_cache[s_name] = {'df': df_s_all_entries, 'list': all_s_entries_list}
-                        
-                        if df_s_all_entries.empty or "날짜" not in df_s_all_entries.columns:
-                            st.warning(f"'{s_name}' 학생 시트에 유효한 데이터가 없습니다.")
-                        else:
-                            entry_df = df_s_all_entries[df_s_all_entries["날짜"] == sel_date_str]
-                            if not entry_df.empty: # 선택한 날짜에 일기가 있는 경우
-                                diary_e = entry_df.iloc[0]
-                                st.subheader(f"📘 {s_name} ({sel_date_str}) 일기"); st.divider()
-                                st.write(f"**감정:** {diary_e.get('감정', 'N/A')}")
-                                st.write(f"**감사한 일:** {diary_e.get('감사한 일', 'N/A')}") # Corrected here
-                                st.write(f"**하고 싶은 말:** {diary_e.get('하고 싶은 말', 'N/A')}")
-                                note_val = diary_e.get('선생님 쪽지', '')
-                                st.write(f"**선생님 쪽지:** {note_val}")
-
-                                note_in = st.text_area("✏️ 쪽지 작성/수정", value=note_val, key=f"note_in_key_{s_name}_{sel_date_str}")
-                                if st.button("💾 쪽지 저장", key=f"save_note_key_{s_name}_{sel_date_str}"):
-                                    if not note_in.strip() and not note_val: st.warning("쪽지 내용이 비어있습니다.")
-                                    else:
-                                        try: # Note saving try-except
-                                            with st.spinner("쪽지 저장 중..."):
-                                                ws_save = g_client.open_by_url(s_url).sheet1 # Re-open for save
-                                                idx_save, hdrs_save = -1, ws_save.row_values(2)
-                                                for i_s, r_s in enumerate(all_s_entries_list): # Use original list for indexing
-                                                    if r_s.get("날짜") == sel_date_str: idx_save = i_s + 3; break
-                                                if idx_save != -1:
-                                                    note_c_idx = hdrs_save.index("선생님 쪽지") + 1 if "선생님 쪽지" in hdrs_save else 5
-                                                    ws_save.update_cell(idx_save, note_c_idx, note_in)
-                                                    if s_name in st.session_state.tab3_student_data_cache:
-                                                        del st.session_state.tab3_student_data_cache[s_name] # Invalidate cache
-                                                    st.success("쪽지 저장 완료!"); st.rerun()
-                                                else: st.error("쪽지 저장 대상 일기 항목을 찾지 못했습니다.")
-                                        except Exception as e_save_note: st.error(f"쪽지 저장 오류: {e_save_note}")
-                            else: 
-                                st.info(f"'{s_name}' 학생은 {sel_date_str}에 작성한 일기가 없습니다.")
-
-                            # --- 학생 전체 기록 기반 분석 섹션 ---
-                            if not df_s_all_entries.empty:
-                                st.markdown("---"); st.subheader("📊 학생 전체 기록 기반 분석")
-                                if st.button(f"{s_name} 전체 기록 누적 분석 (워드클라우드, 감정 통계)", key=f"cumul_btn_{s_name}"):
-                                    st.write("##### 전체 감정 통계 (긍정, 보통, 부정)")
-                                    if "감정" in df_s_all_entries.columns and not df_s_all_entries["감정"].empty:
-                                        def get_main_emo(emo_str):
-                                            if isinstance(emo_str, str) and " - " in emo_str:
-                                                main_g = emo_str.split(" - ")[0].strip()
-                                                if main_g in EMOTION_GROUPS: return main_g
-                                            return None
-                                        df_s_all_entries['감정 대분류_차트'] = df_s_all_entries['감정'].apply(get_main_emo)
-                                        valid_emo_counts = df_s_all_entries['감정 대분류_차트'].dropna().value_counts()
-                                        chart_srs = pd.Series(index=EMOTION_GROUPS, dtype='int64').fillna(0)
-                                        for grp, cnt in valid_emo_counts.items():
-                                            if grp in chart_srs.index: chart_srs[grp] = cnt
-                                        if not chart_srs.empty and chart_srs.sum() > 0: st.bar_chart(chart_srs)
-                                        else: st.info("차트에 표시할 유효한 감정 기록이 없습니다.")
-                                    else: st.info("감정 데이터 부족.")
-                                    
-                                    st.write("##### 전체 '감사한 일' & '하고 싶은 말' 단어 분석 (워드클라우드)")
-                                    wc_texts = []
-                                    for col in ["감사한 일", "하고 싶은 말"]: # Corrected to "감사한 일"
-                                        if col in df_s_all_entries.columns: wc_texts.extend(df_s_all_entries[col].dropna().astype(str).tolist())
-                                    wc_data_str = " ".join(wc_texts)
-                                    if wc_data_str.strip():
-                                        try:
-                                            wc = WordCloud(font_path=FONT_PATH, width=700, height=350, background_color="white").generate(wc_data_str)
-                                            fig, ax = plt.subplots(); ax.imshow(wc, interpolation='bilinear'); ax.axis("off"); st.pyplot(fig)
-                                        except Exception as e: st.error(f"워드클라우드 오류 (폰트: '{FONT_PATH}'): {e}")
-                                    else: st.info("워드클라우드용 단어 부족.")
-                                
-                                st.markdown("---") 
-                                st.subheader(f"🤖 {s_name} 학생 전체 기록 GPT 심층 분석") 
-                                if st.button(f"GPT로 전체 기록 심층 분석 실행 📝", key=f"gpt_cumul_btn_{s_name}"):
-                                    if not openai_api_key or not client_openai: st.error("OpenAI API 키 또는 클라이언트 미설정.")
-                                    else:
-                                        with st.spinner(f"GPT가 {s_name} 학생의 전체 기록을 분석 중... (시간 소요)"):
-                                            try:
-                                                c_emo = [f"일자({r.get('날짜','')}): {r.get('감정','')}" for r in all_s_entries_list if r.get('감정')]
-                                                c_grat = [f"일자({r.get('날짜','')}): {r.get('감사한 일','')}" for r in all_s_entries_list if r.get('감사한 일','').strip()] # Corrected
-                                                c_msg = [f"일자({r.get('날짜','')}): {r.get('하고 싶은 말','')}" for r in all_s_entries_list if r.get('하고 싶은 말','').strip()]
-                                                gpt_data = (f"### 전체 감정:\n" + ("\n".join(c_emo) if c_emo else "기록 없음") + "\n\n"
-                                                            f"### 전체 감사한 일:\n" + ("\n".join(c_grat) if c_grat else "기록 없음") + "\n\n" # Corrected
-                                                            f"### 전체 하고 싶은 말:\n" + ("\n".join(c_msg) if c_msg else "기록 없음"))
-                                                
-                                                prompt_parts = GPT_CUMULATIVE_SYSTEM_PROMPT.split("학생의 누적 기록 데이터:")
-                                                sys_instr = prompt_parts[0].strip()
-                                                user_req_tmpl = "학생의 누적 기록 데이터:" + prompt_parts[1]
-                                                fmt_user_req = user_req_tmpl.format(cumulative_diary_data_for_gpt=gpt_data)
-
-                                                gpt_resp = client_openai.chat.completions.create(
-                                                    model="gpt-4o",
-                                                    messages=[{"role": "system", "content": sys_instr}, {"role": "user", "content": fmt_user_req}],
-                                                    temperature=0.7, max_tokens=3500 )
-                                                gpt_res_text = gpt_resp.choices[0].message.content
-                                                st.markdown("##### 💡 GPT 누적 분석 리포트:")
-                                                with st.expander("결과 보기", expanded=True): st.markdown(gpt_res_text)
-                                            except Exception as e: st.error(f"GPT 분석 오류: {e}")
-                            # End of "if not df_s_all_entries.empty" for analyses
-                    # This is the try block for individual student sheet processing (open, read, display, buttons)
-                    except gspread.exceptions.SpreadsheetNotFound:
-                        st.error(f"'{s_name}' 학생 시트 URL({s_url})을 찾을 수 없습니다.")
-                    except gspread.exceptions.APIError as ge_api_detail:
-                         st.error(f"Google Sheets API 오류 ({ge_api_detail.response.status_code})로 '{s_name}' 학생 데이터를 가져올 수 없습니다. 잠시 후 다시 시도해주세요.")
-                    except Exception as e_detail_page: # This was the line for SyntaxError
-                        st.error(f"'{s_name}' 학생 데이터 처리 중 오류 발생: {type(e_detail_page).__name__} - {e_detail_page}")
-                # End of "if selected_student_name_final:"
-            else: # 학생 미선택 시
-                st.info("상단에서 학생을 선택하여 상세 내용을 확인하고 분석 기능을 사용하세요.")
-        # End of "if students_df.empty:" else
+        st.fragment(student_detail_tab)(store, record_cache, students_df, api_metrics)
+
+    with tab4: # 학급 감정 추이
+        st.header(tab_names[3])
+        st.fragment(class_trends_tab)(store, students_df)
+
+    # 화면을 다 그린 뒤에 집계해야 이번 실행의 호출이 모두 포함된다
+    with st.sidebar.expander("📈 API 호출 현황 (관리자)"): api_metrics_panel(api_metrics, rerun_id, record_cache)
+    if g_client:
+        with st.sidebar.expander("🗂️ 학생 시트 통합 (관리자)"):
+            workbook_migration_panel(get_sheets_api(), store, get_sheet_handles(g_client), sync_worker, students_df)
 # End of "if not st.session_state.teacher_logged_in:" else (main app logic)
@@ -0,0 +1,38 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_metrics import ApiMetrics  # noqa: E402
+from diary_store import DiaryStore  # noqa: E402
+from fake_backends import FakeGspreadClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    # teacher_diary_app.py는 Streamlit 스크립트라 import하면 로그인 화면까지 실행된다 (bare mode). secrets 파일 없이 기본값으로.
+    with mock.patch.object(st, "secrets", {}):
+        import teacher_diary_app
+    return teacher_diary_app
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DiaryStore(str(tmp_path / "diary.sqlite3"))
+    yield store
+    store.conn.close()
+
+
+@pytest.fixture
+def client():
+    # 학생 1명, 10일치. worksheet_for("학생01").rows를 직접 고쳐 시트 변경을 흉내 낸다.
+    return FakeGspreadClient(1, 10, submit_rate=1.0)
+
+
+@pytest.fixture
+def api(app):
+    return app.SheetsApi(10_000, ApiMetrics())
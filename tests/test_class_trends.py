@@ -0,0 +1,69 @@
+import pandas as pd
+
+from class_trends import NEGATIVE_GROUP, UNCLASSIFIED, build_emotion_frame, class_trends, negative_runs
+
+POS, MID = "😀 긍정", "😐 보통"
+
+
+def _frame(rows):
+    # rows: (student, date, emotion_group) -> build_emotion_frame이 받는 emotion_rows() 모양
+    raw = pd.DataFrame([(s, i + 2, d, g) for i, (s, d, g) in enumerate(rows)], columns=["student", "row_num", "date", "emotion_group"])
+    return build_emotion_frame(raw)
+
+
+def test_build_frame_keeps_last_entry_per_day_and_drops_bad_dates():
+    df = _frame([("학생01", "2026-03-02", POS), ("학생01", "2026-03-02", NEGATIVE_GROUP), ("학생01", "3월 3일", POS),
+                 ("학생02", "2026-03-02", None)])
+    assert len(df) == 2
+    assert df.set_index("student")["emotion_group"].astype(str).to_dict() == {"학생01": NEGATIVE_GROUP, "학생02": UNCLASSIFIED}
+
+
+def test_negative_runs_skip_missing_days_and_mark_ongoing():
+    df = _frame([("학생01", "2026-03-02", NEGATIVE_GROUP), ("학생01", "2026-03-04", NEGATIVE_GROUP), ("학생01", "2026-03-06", NEGATIVE_GROUP),
+                 ("학생02", "2026-03-02", NEGATIVE_GROUP), ("학생02", "2026-03-03", NEGATIVE_GROUP), ("학생02", "2026-03-04", NEGATIVE_GROUP),
+                 ("학생02", "2026-03-05", POS),
+                 ("학생03", "2026-03-02", NEGATIVE_GROUP), ("학생03", "2026-03-03", MID), ("학생03", "2026-03-04", NEGATIVE_GROUP)])
+    runs = negative_runs(df, 3)
+    assert runs[["학생", "일수", "진행 중"]].values.tolist() == [["학생01", 3, True], ["학생02", 3, False]]
+    assert runs.loc[0, "시작"] == pd.Timestamp("2026-03-02") and runs.loc[0, "끝"] == pd.Timestamp("2026-03-06")
+
+
+def test_negative_runs_do_not_join_across_students():
+    df = _frame([("학생01", "2026-03-05", NEGATIVE_GROUP), ("학생02", "2026-03-02", NEGATIVE_GROUP)])
+    assert negative_runs(df, 2).empty
+
+
+def test_negative_runs_without_negative_entries_is_empty():
+    assert negative_runs(_frame([("학생01", "2026-03-02", POS)]), 1).empty
+    assert negative_runs(_frame([]), 1).empty
+
+
+def test_class_trends_daily_weekly_and_submission():
+    df = _frame([("학생01", "2026-03-06", POS), ("학생02", "2026-03-06", NEGATIVE_GROUP), ("학생01", "2026-03-07", MID),
+                 ("학생01", "2026-03-09", POS), ("학생01", "2026-02-27", POS)])
+    tr = class_trends(df, "2026-03-02", "2026-03-10", n_students=2)
+    assert tr["n_entries"] == 4 and len(tr["daily"]) == 9
+    assert tr["daily"].loc["2026-03-06"].tolist() == [1, 0, 1, 0]
+    assert tr["weekly"].index.tolist() == [pd.Timestamp("2026-03-02"), pd.Timestamp("2026-03-09")]
+    assert tr["weekly_share"].loc["2026-03-02", POS] == 1 / 3 and tr["weekly_share"].loc["2026-03-09", POS] == 1.0
+    assert tr["submission"].loc["2026-03-06"] == 1.0 and tr["submission"].loc["2026-03-08"] == 0.0
+
+
+def test_class_trends_skip_weekends():
+    df = _frame([("학생01", "2026-03-06", POS), ("학생01", "2026-03-07", MID)])
+    tr = class_trends(df, "2026-03-02", "2026-03-08", n_students=1, skip_weekends=True)
+    assert len(tr["daily"]) == 5 and tr["n_entries"] == 1 and tr["daily"][MID].sum() == 0
+
+
+def test_load_emotion_frame_reuses_parquet_until_data_changes(store, tmp_path, monkeypatch):
+    from class_trends import load_emotion_frame
+    store.replace_roster([("학생01", "https://docs.google.com/spreadsheets/d/fake-student-01", None)])
+    path = str(tmp_path / "emotions.parquet")
+    assert load_emotion_frame(store, path).empty
+    monkeypatch.setattr(store, "emotion_rows", lambda: (_ for _ in ()).throw(AssertionError("다시 만들면 안 됨")))
+    assert load_emotion_frame(store, path).empty
+    monkeypatch.undo()
+    store.replace_entries("학생01", 2, [{"날짜": "2026-03-02", "감정": "😢 부정 - 슬픔", "감사한 일": "", "하고 싶은 말": "", "선생님 쪽지": "", "_row": 2}],
+                          ["날짜", "감정", "감사한 일", "하고 싶은 말", "선생님 쪽지"], 2, 2)
+    assert len(load_emotion_frame(store, path)) == 1
+    assert sorted(p.name for p in tmp_path.iterdir() if "emotions" in p.name) == ["emotions.parquet"]  # 임시 파일이 남지 않는다
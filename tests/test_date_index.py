@@ -0,0 +1,36 @@
+from diary_store import StudentRecords
+
+URL = "https://docs.google.com/spreadsheets/d/fake-student-01"
+
+
+def _rec(row, date, emotion="😀 긍정 - 기쁨", message=""):
+    return {"날짜": date, "감정": emotion, "감사한 일": "", "하고 싶은 말": message, "선생님 쪽지": "", "_row": row}
+
+
+def test_date_lookup_returns_entries_in_row_order():
+    recs = StudentRecords([_rec(3, "2026-03-02"), _rec(4, "2026-03-03"), _rec(5, "2026-03-03", "😢 부정 - 슬픔")], version=1)
+    assert [e["_row"] for e in recs.entries("2026-03-03")] == [4, 5]
+    assert recs.entries("2026-03-04") == []
+
+
+def test_duplicate_date_defaults_to_latest_row():
+    recs = StudentRecords([_rec(3, "2026-03-03", "😀 긍정 - 기쁨"), _rec(4, "2026-03-03", "😢 부정 - 슬픔")], version=1)
+    assert recs.primary("2026-03-03")["_row"] == 4
+    assert recs.primary("2026-03-04") is None
+
+
+def test_pick_duplicate_by_row_and_annotate_it():
+    recs = StudentRecords([_rec(3, "2026-03-03"), _rec(4, "2026-03-03")], version=1)
+    recs.set_note(3, "앞의 일기에 쓴 쪽지")
+    assert recs.at_row(3)["선생님 쪽지"] == "앞의 일기에 쓴 쪽지"
+    assert recs.at_row(4)["선생님 쪽지"] == ""
+    assert recs.at_row(99) is None
+
+
+def test_today_summary_uses_latest_row_for_duplicate_dates(store):
+    store.replace_roster([("학생01", URL, None), ("학생02", URL + "2", None)])
+    store.replace_entries("학생01", 3, [_rec(3, "2026-03-03", "😀 긍정 - 기쁨", "처음"), _rec(4, "2026-03-03", "😢 부정 - 슬픔", "나중")],
+                          ["날짜"], 4, ["2026-03-03"])
+    summary = {d["name"]: d for d in store.today_summary("2026-03-03")}
+    assert (summary["학생01"]["emotion_today"], summary["학생01"]["message_today"]) == ("😢 부정 - 슬픔", "나중")
+    assert summary["학생02"]["error"] == "오늘 일기 없음"
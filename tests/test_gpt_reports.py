@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+URL = "https://docs.google.com/spreadsheets/d/fake-student-01"
+
+
+class Completer:
+    # chat.completions.create 대역: 받은 요청을 기록하고 모델 이름과 순번으로 답한다
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"{kwargs['model']} 응답 {len(self.calls)}"))])
+
+
+def _records(n, start_row=3):
+    return [{"날짜": f"2026-01-{i % 28 + 1:02d}", "감정": "😀 긍정 - 기쁨", "감사한 일": f"감사 {i}", "하고 싶은 말": "", "선생님 쪽지": "",
+             "_row": start_row + i} for i in range(n)]
+
+
+def _report(app, store, complete, records, incremental=False, budget=None):
+    return asyncio.run(app.get_cumulative_report(complete, store, "학생01", records, incremental, budget or app.GPT_INPUT_TOKEN_BUDGET))
+
+
+@pytest.fixture
+def gpt_store(store):
+    store.replace_roster([("학생01", URL, None)])
+    return store
+
+
+def test_same_records_reuse_saved_report(app, gpt_store):
+    complete, records = Completer(), _records(5)
+    report, cached, key = _report(app, gpt_store, complete, records)
+    assert cached is None and len(complete.calls) == 1
+    report2, cached2, key2 = _report(app, gpt_store, complete, records)
+    assert (report2, key2) == (report, key) and cached2["report"] == report
+    assert len(complete.calls) == 1
+    assert gpt_store.latest_gpt_report("학생01")["through_row"] == records[-1]["_row"]
+
+
+def test_changed_records_get_a_new_report(app, gpt_store):
+    complete, records = Completer(), _records(5)
+    _, _, key = _report(app, gpt_store, complete, records)
+    records[2]["감사한 일"] = "고쳐 씀"
+    _, cached, key2 = _report(app, gpt_store, complete, records)
+    assert cached is None and key2 != key and len(complete.calls) == 2
+
+
+def test_incremental_mode_digests_only_new_older_rows(app, gpt_store):
+    complete, n_recent = Completer(), app.GPT_RECENT_ENTRIES
+    records = _records(n_recent + 3)
+    _report(app, gpt_store, complete, records, incremental=True)
+    assert [c["model"] for c in complete.calls] == [app.GPT_DIGEST_MODEL, app.GPT_MODEL]
+    assert gpt_store.get_gpt_digest("학생01")["through_row"] == records[2]["_row"]
+
+    complete.calls.clear()
+    records = _records(n_recent + 4)  # 한 건이 최근 구간에서 밀려나 요약에 합쳐진다
+    _report(app, gpt_store, complete, records, incremental=True)
+    digest_call = complete.calls[0]
+    assert digest_call["model"] == app.GPT_DIGEST_MODEL
+    assert "감사 3" in digest_call["messages"][1]["content"] and "감사 2" not in digest_call["messages"][1]["content"]
+    assert f"[이전 요약]\n{app.GPT_DIGEST_MODEL} 응답 1" in digest_call["messages"][1]["content"]
+
+
+def test_edited_older_row_rebuilds_digest_from_scratch(app, gpt_store):
+    complete, records = Completer(), _records(app.GPT_RECENT_ENTRIES + 3)
+    _report(app, gpt_store, complete, records, incremental=True)
+    complete.calls.clear()
+    records[0]["감사한 일"] = "예전 기록 수정"
+    _report(app, gpt_store, complete, records, incremental=True)
+    assert "[이전 요약]\n없음" in complete.calls[0]["messages"][1]["content"]
+
+
+def test_over_budget_input_is_rejected_before_calling(app, gpt_store):
+    complete = Completer()
+    with pytest.raises(ValueError):
+        _report(app, gpt_store, complete, _records(50), budget=100)
+    assert complete.calls == []
+
+
+def test_fake_openai_clients_keep_their_own_call_log(app, gpt_store):
+    from fake_backends import FakeAsyncOpenAI
+    first, second = FakeAsyncOpenAI(), FakeAsyncOpenAI()
+    report, _, _ = _report(app, gpt_store, first.chat.completions.create, _records(5))
+    assert report.startswith("### 가짜 리포트") and first.calls == [app.GPT_MODEL] and second.calls == []
@@ -0,0 +1,141 @@
+from fake_backends import HEADER
+
+URL = "https://docs.google.com/spreadsheets/d/fake-student-01"
+
+
+def _record(day, note=""):
+    return {"날짜": f"2026-03-{day:02d}", "감정": "😀 긍정 - 기쁨", "감사한 일": "친구", "하고 싶은 말": "", "선생님 쪽지": note}
+
+
+def _synced(store, n_entries=3):
+    # 1행 제목, 2행 헤더, 3행부터 일기 n_entries건을 전체 동기화한 상태
+    store.replace_roster([("학생01", URL, None)])
+    records = [_record(i + 1) for i in range(n_entries)]
+    last = n_entries + 2
+    store.replace_entries("학생01", 3, records, list(HEADER), last, [records[-1]["날짜"], records[-1]["감정"], "친구"])
+    return last
+
+
+def test_enqueue_updates_local_copy_and_version(store):
+    _synced(store)
+    before = store.student_version("학생01")
+    assert store.enqueue_note("학생01", 3, URL, "잘했어요") == before + 1
+    assert store.student_records("학생01")[0]["선생님 쪽지"] == "잘했어요"
+    assert store.note_status("학생01", 3)["status"] == "pending"
+
+
+def test_repeated_edits_coalesce_into_one_item(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "첫 쪽지")
+    store.enqueue_note("학생01", 3, URL, "고친 쪽지")
+    assert store.note_queue_counts() == {"pending": 1}
+    assert [(it["row_num"], it["note"]) for it in store.claim_due_notes(0, 5)] == [(3, "고친 쪽지")]
+
+
+def test_pending_notes_wait_for_debounce(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "쪽지")
+    assert store.claim_due_notes(3600, 5) == []
+    assert len(store.claim_due_notes(3600, 5, force=True)) == 1
+
+
+def test_edit_during_flush_stays_pending(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "처음")
+    claimed = store.claim_due_notes(0, 5)
+    store.enqueue_note("학생01", 3, URL, "쓰는 중에 고침")
+    store.mark_notes_flushed(claimed)
+    assert store.note_status("학생01", 3)["status"] == "pending"
+    assert [it["note"] for it in store.claim_due_notes(0, 5)] == ["쓰는 중에 고침"]
+
+
+def test_flushed_note_on_cursor_row_patches_last_row(store):
+    last = _synced(store)
+    store.enqueue_note("학생01", last, URL, "마지막 행 쪽지")
+    store.mark_notes_flushed(store.claim_due_notes(0, 5))
+    assert store.get_cursor("학생01")["last_row"][HEADER.index("선생님 쪽지")] == "마지막 행 쪽지"
+    assert store.note_status("학생01", last)["status"] == "flushed"
+
+
+def test_flushed_note_elsewhere_leaves_last_row(store):
+    _synced(store)
+    before = store.get_cursor("학생01")["last_row"]
+    store.enqueue_note("학생01", 3, URL, "첫 행 쪽지")
+    store.mark_notes_flushed(store.claim_due_notes(0, 5))
+    assert store.get_cursor("학생01")["last_row"] == before
+
+
+def test_failed_notes_stop_at_attempt_cap(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "쪽지")
+    for attempt in (1, 2):
+        claimed = store.claim_due_notes(0, 2)
+        assert len(claimed) == 1
+        store.mark_notes_failed(claimed, "APIError", retry_delay_sec=0)
+        assert store.note_status("학생01", 3) == {"status": "failed", "attempts": attempt, "error": "APIError"}
+    assert store.claim_due_notes(0, 2) == []
+    store.retry_failed_notes()
+    assert store.note_status("학생01", 3)["attempts"] == 0
+    assert len(store.claim_due_notes(0, 2)) == 1
+
+
+def test_failed_note_waits_for_retry_delay(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "쪽지")
+    store.mark_notes_failed(store.claim_due_notes(0, 5), "APIError", retry_delay_sec=3600)
+    assert store.claim_due_notes(0, 5) == []
+
+
+def test_full_resync_keeps_unflushed_note(store):
+    _synced(store)
+    store.enqueue_note("학생01", 4, URL, "아직 안 씀")
+    _synced(store)
+    assert store.student_records("학생01")[1]["선생님 쪽지"] == "아직 안 씀"
+
+
+def test_restart_requeues_notes_left_flushing(store):
+    from diary_store import DiaryStore
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "쪽지")
+    store.claim_due_notes(0, 5)
+    reopened = DiaryStore(store.path)
+    assert reopened.note_status("학생01", 3)["status"] == "pending"
+    reopened.conn.close()
+
+
+
+def test_flusher_writes_note_and_keeps_next_sync_incremental(app, api, store, client):
+    # 마지막 행(커서 위치)에 쪽지를 쓴 뒤에도 다음 동기화는 batchGet 한 번
+    ws = client.worksheet_for("학생01")
+    url = client.roster._worksheets[0].rows[1][1]
+    store.replace_roster([("학생01", url, None)])
+    app.sync_student_sheet(api, store, ws, "학생01", app.EXPECTED_STUDENT_SHEET_HEADER)
+    flusher = app.NoteFlusher(api, store, app.SheetHandles(api, client), delay_sec=3600, max_attempts=5)
+    store.enqueue_note("학생01", len(ws.rows), url, "잘했어요")
+    assert flusher.flush(force=True) == 1
+    assert ws.rows[-1][4] == "잘했어요"
+    assert store.note_status("학생01", len(ws.rows))["status"] == "flushed"
+    client.gate.reset()
+    app.sync_student_sheet(api, store, ws, "학생01", app.EXPECTED_STUDENT_SHEET_HEADER)
+    assert client.gate.calls == ["values.batchGet"]
+
+
+def test_roster_move_drops_queued_notes_for_old_sheet(store):
+    _synced(store)
+    store.replace_roster([("학생01", URL, None), ("학생02", URL.replace("01", "02"), None)])
+    store.enqueue_note("학생01", 3, URL, "예전 시트 쪽지")
+    store.enqueue_note("학생02", 3, URL.replace("01", "02"), "그대로")
+    store.replace_roster([("학생01", "https://docs.google.com/spreadsheets/d/fake-workbook-01", "학생01"), ("학생02", URL.replace("01", "02"), None)])
+    assert store.note_status("학생01", 3) is None and store.note_queue_counts() == {"pending": 1}
+
+
+def test_removed_student_leaves_no_queue_or_gpt_rows(store):
+    _synced(store)
+    store.enqueue_note("학생01", 3, URL, "쪽지")
+    store.put_gpt_report("k1", "학생01", "m", "v", "full", "리포트", 5)
+    store.put_gpt_digest("학생01", 4, "2026-03-02", "h", "요약", "m", "v")
+    store.replace_roster([])
+    for table in ("note_queue", "gpt_reports", "gpt_digests"):
+        assert store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0, table
+    store.replace_roster([("학생01", URL, None)])  # 같은 이름이 다시 들어와도 예전 리포트가 보이지 않는다
+    assert store.latest_gpt_report("학생01") is None and store.get_gpt_digest("학생01") is None
@@ -0,0 +1,65 @@
+from diary_store import RecordCache
+
+
+def _records(n, note=""):
+    return [{"날짜": f"2026-01-{i + 1:02d}", "감정": "😀 긍정 - 기쁨", "감사한 일": "친구", "하고 싶은 말": "", "선생님 쪽지": note, "_row": i + 2}
+            for i in range(n)]
+
+
+class Loader:
+    def __init__(self, records):
+        self.records, self.calls = records, 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.records
+
+
+def test_same_version_is_served_from_cache():
+    cache, load = RecordCache(10 ** 7), Loader(_records(3))
+    first = cache.get("학생01", 1, load)
+    assert cache.get("학생01", 1, load) is first and load.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_new_version_reloads():
+    cache, load = RecordCache(10 ** 7), Loader(_records(3))
+    cache.get("학생01", 1, load)
+    load.records = _records(4)
+    recs = cache.get("학생01", 2, load)
+    assert load.calls == 2 and recs.version == 2 and len(recs.rows) == 4
+    assert cache.stats()["students"] == 1 and cache.stats()["nbytes"] == recs.nbytes
+
+
+def test_least_recently_used_student_is_evicted_over_budget():
+    probe = RecordCache(10 ** 7).get("x", 1, Loader(_records(20)))
+    cache = RecordCache(probe.nbytes * 2 + probe.nbytes // 2)  # 두 명까지만 들어간다
+    loads = {name: Loader(_records(20)) for name in ("학생01", "학생02", "학생03")}
+    cache.get("학생01", 1, loads["학생01"]); cache.get("학생02", 1, loads["학생02"])
+    cache.get("학생01", 1, loads["학생01"])  # 학생01을 최근에 씀 -> 학생02가 가장 오래됨
+    cache.get("학생03", 1, loads["학생03"])
+    assert list(cache.entries) == ["학생01", "학생03"]
+    assert cache.stats()["evictions"] == 1 and cache.nbytes <= cache.budget_bytes
+
+
+def test_single_student_over_budget_is_still_kept():
+    cache = RecordCache(1)
+    recs = cache.get("학생01", 1, Loader(_records(5)))
+    assert cache.get("학생01", 1, Loader(_records(5))) is recs and cache.stats()["evictions"] == 0
+
+
+def test_note_written_patches_cell_and_bumps_version():
+    cache, load = RecordCache(10 ** 7), Loader(_records(3))
+    recs = cache.get("학생01", 1, load)
+    cache.note_written("학생01", 3, "잘했어요", 2)
+    assert recs.version == 2 and recs.at_row(3)["선생님 쪽지"] == "잘했어요"
+    assert cache.get("학생01", 2, load) is recs and load.calls == 1
+
+
+def test_note_written_on_stale_version_drops_student():
+    cache, load = RecordCache(10 ** 7), Loader(_records(3))
+    cache.get("학생01", 1, load)
+    cache.note_written("학생01", 3, "잘했어요", 5)  # 그 사이 동기화로 version이 여러 번 올랐다
+    assert "학생01" not in cache.entries and cache.nbytes == 0
+    cache.note_written("학생02", 3, "잘했어요", 2)  # 캐시에 없는 학생은 무시
+    assert cache.stats()["students"] == 0
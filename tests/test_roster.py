@@ -0,0 +1,24 @@
+URL = "https://docs.google.com/spreadsheets/d/fake-student-01"
+
+
+def test_duplicate_roster_names_keep_first_row(store):
+    store.replace_roster([("학생01", URL, None), ("학생01", "https://other", None)], ["3행: 중복"])
+    assert store.students_df()["시트URL"].tolist() == [URL]
+    assert store.roster_problems() == ["3행: 중복"]
+
+
+def test_fetch_roster_skips_blank_rows_and_reports_duplicates(app, api, client):
+    rows = client.roster._worksheets[0].rows
+    rows[2:2] = [["", ""], ["", ""]]
+    rows.append(["학생01", "https://other"])
+    roster, problems = app.fetch_roster(api, app.SheetHandles(api, client))
+    assert roster == [("학생01", URL, None)]
+    assert problems == ["'학생목록' 5행: 이름 '학생01'이(가) 2행과 중복되어 건너뜁니다."]
+
+
+def test_roster_change_resets_cursor_and_entries(store):
+    store.replace_roster([("학생01", URL, None)])
+    store.replace_entries("학생01", 3, [{"날짜": "2026-03-02", "감정": "😀 긍정 - 기쁨"}], ["날짜"], 3, ["2026-03-02"])
+    store.replace_roster([("학생01", "https://moved", None)])
+    assert store.get_cursor("학생01")["n_rows"] == 0
+    assert store.student_records("학생01") == []
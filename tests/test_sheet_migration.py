@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+from fake_backends import FakeGspreadClient, FakeWorksheet
+from sheet_migration import copy_student_sheet, migrate_to_workbooks, plan_migration, update_roster
+
+
+@pytest.fixture
+def client():
+    return FakeGspreadClient(3, 10, submit_rate=1.0)
+
+
+@pytest.fixture
+def handles(app, api, client):
+    return app.SheetHandles(api, client)
+
+
+def _roster_df(rows):
+    return pd.DataFrame(rows, columns=["이름", "시트URL", "워크시트"])
+
+
+def _sync_roster(app, api, store, handles):
+    store.replace_roster(*app.fetch_roster(api, handles))
+    return store.students_df()
+
+
+def test_plan_skips_workbook_students_and_bad_urls_and_splits_evenly():
+    df = _roster_df([("학생01", "https://a", None), ("학생02", "https://b", None), ("학생03", "https://book", "학생03"),
+                     ("학생04", "없음", None), ("학생05", "https://c", None)])
+    plan = plan_migration(df, ["https://book1", "https://book2"])
+    assert [(name, book) for name, _, book, _ in plan] == [("학생01", "https://book1"), ("학생02", "https://book1"), ("학생05", "https://book2")]
+    assert plan_migration(df, []) == [] and plan_migration(pd.DataFrame(), ["https://book1"]) == []
+
+
+def test_plan_makes_worksheet_titles_valid_and_unique():
+    df = _roster_df([("김/민수", "https://a", None), ("김_민수", "https://b", None), ("", "https://c", None)])
+    assert [title for *_, title in plan_migration(df, ["https://book1"])] == ["김_민수", "김_민수 (2)", "학생"]
+
+
+def test_copy_keeps_every_column_and_writes_user_entered(app, api, client, handles, monkeypatch):
+    src_url, book_url = "https://docs.google.com/spreadsheets/d/fake-student-01", client.add_workbook()
+    client.student_worksheet(src_url).rows[4] += ["", "추가 열"]  # E열 뒤에도 값이 있는 행
+    options = []
+    original = FakeWorksheet.update
+    monkeypatch.setattr(FakeWorksheet, "update", lambda ws, values, range_name=None, **kw: (options.append((range_name, kw)),
+                                                                                           original(ws, values, range_name, **kw))[1])
+    n = copy_student_sheet(api, handles, "학생01", src_url, book_url, "학생01", 5)
+    copied = client.by_url[book_url]._by_title("학생01")
+    assert n == 12 and copied.rows == client.student_worksheet(src_url).get_all_values()
+    assert options == [("A1:G12", {"value_input_option": "USER_ENTERED"})]
+
+    copy_student_sheet(api, handles, "학생01", src_url, book_url, "학생01", 5)  # 다시 실행하면 같은 워크시트를 비우고 다시 쓴다
+    assert [ws.title for ws in client.by_url[book_url]._worksheets].count("학생01") == 1 and len(copied.rows) == 12
+
+
+def test_update_roster_moves_students_and_keeps_old_url(app, api, client, handles):
+    book_url = client.add_workbook()
+    client.roster._worksheets[0].rows.append(["학생01", "https://docs.google.com/spreadsheets/d/dup"])  # 같은 이름은 첫 행만 바꾼다
+    plan = [("학생01", "https://docs.google.com/spreadsheets/d/fake-student-01", book_url, "학생01")]
+    update_roster(api, handles, plan)
+    rows = client.roster._worksheets[0].rows
+    assert rows[0] == ["이름", "시트URL", "워크시트", "이전시트URL"]
+    assert rows[1] == ["학생01", book_url, "학생01", "https://docs.google.com/spreadsheets/d/fake-student-01"]
+    assert rows[2] == ["학생02", "https://docs.google.com/spreadsheets/d/fake-student-02"] and rows[-1][1].endswith("/dup")
+
+
+def test_migrated_students_sync_from_workbook_like_single_sheets(app, api, store, client, handles):
+    headers = app.EXPECTED_STUDENT_SHEET_HEADER
+    df = _sync_roster(app, api, store, handles)
+    for name, url in zip(df["이름"], df["시트URL"]): app.sync_one_student(api, store, handles, name, url, headers)
+    before = {name: store.student_records(name) for name in df["이름"]}
+
+    migrate_to_workbooks(api, handles, plan_migration(df, [client.add_workbook()]), headers)
+    df = _sync_roster(app, api, store, handles)
+    assert df["워크시트"].tolist() == ["학생01", "학생02", "학생03"] and df["시트URL"].nunique() == 1
+    errors = app.sync_workbook(api, store, handles, df["시트URL"][0], list(zip(df["이름"], df["워크시트"])), headers)
+    assert errors == {} and {name: store.student_records(name) for name in df["이름"]} == before
+
+    client.worksheet_for("학생02").append_row(["2099-01-01", "😀 긍정 - 기쁨", "새 일기", "", ""])
+    gate_before = client.gate.count("values.batchGet")
+    app.sync_workbook(api, store, handles, df["시트URL"][0], list(zip(df["이름"], df["워크시트"])), headers)
+    assert client.gate.count("values.batchGet") == gate_before + 1  # 세 명 증분을 한 번에
+    assert store.student_records("학생02")[-1]["감사한 일"] == "새 일기" and store.student_records("학생01") == before["학생01"]
+
+
+def test_sync_workbook_reports_missing_worksheet(app, api, store, client, handles):
+    book_url = client.add_workbook()
+    store.replace_roster([("학생01", book_url, "없는 시트")])
+    errors = app.sync_workbook(api, store, handles, book_url, [("학생01", "없는 시트")], app.EXPECTED_STUDENT_SHEET_HEADER)
+    assert errors == {"학생01": "워크시트 찾기 실패"} and store.student_sync_info("학생01")["sync_error"] == "워크시트 찾기 실패"
+
+
+def test_partly_migrated_roster_syncs_both_kinds(app, api, store, client, handles):
+    headers = app.EXPECTED_STUDENT_SHEET_HEADER
+    app.sync_all_students(api, store, handles, headers, 2)
+    before = {name: store.student_records(name) for name in ("학생01", "학생02", "학생03")}
+    df = store.students_df()
+    migrate_to_workbooks(api, handles, plan_migration(df[df["이름"] == "학생02"], [client.add_workbook()]), headers)
+    app.sync_all_students(api, store, handles, headers, 2)
+    df = store.students_df()
+    assert df["워크시트"].tolist() == [None, "학생02", None]  # 워크시트가 없는 학생은 NaN이 아니라 None
+    assert {name: store.student_records(name) for name in before} == before
+    assert not any(store.student_sync_info(name)["sync_error"] for name in before)
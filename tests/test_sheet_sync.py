@@ -0,0 +1,66 @@
+NAME = "학생01"
+
+
+def _sync(app, api, store, ws):
+    app.sync_student_sheet(api, store, ws, NAME, app.EXPECTED_STUDENT_SHEET_HEADER)
+
+
+def _setup(app, api, store, client):
+    ws = client.worksheet_for(NAME)
+    store.replace_roster([(NAME, client.roster._worksheets[0].rows[1][1], None)])
+    _sync(app, api, store, ws)
+    client.gate.reset()
+    return ws
+
+
+def test_first_sync_reads_whole_sheet(app, api, store, client):
+    ws = client.worksheet_for(NAME)
+    store.replace_roster([(NAME, "https://x", None)])
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.get"]
+    assert [r["_row"] for r in store.student_records(NAME)] == list(range(3, len(ws.rows) + 1))
+    assert store.get_cursor(NAME)["n_rows"] == len(ws.rows)
+
+
+def test_new_rows_are_read_incrementally(app, api, store, client):
+    ws = _setup(app, api, store, client)
+    ws.rows.append(["2030-01-01", "😢 부정 - 슬픔", "", "속상해요", ""])
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.batchGet"]
+    assert store.student_records(NAME)[-1] == {"날짜": "2030-01-01", "감정": "😢 부정 - 슬픔", "감사한 일": "", "하고 싶은 말": "속상해요",
+                                                 "선생님 쪽지": "", "_row": len(ws.rows)}
+
+
+def test_unchanged_sheet_costs_one_batch_get(app, api, store, client):
+    ws = _setup(app, api, store, client)
+    version = store.student_version(NAME)
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.batchGet"]
+    assert store.student_version(NAME) == version
+
+
+def test_edited_cursor_row_triggers_full_resync(app, api, store, client):
+    ws = _setup(app, api, store, client)
+    ws.rows[-1][3] = "고쳐 씀"
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.batchGet", "values.get"]
+    assert store.student_records(NAME)[-1]["하고 싶은 말"] == "고쳐 씀"
+
+
+def test_changed_header_triggers_full_resync(app, api, store, client):
+    ws = _setup(app, api, store, client)
+    ws.rows[1][2] = "고마운 일"
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.batchGet", "values.get"]
+
+
+def test_columns_beyond_expected_headers_do_not_force_full_resync(app, api, store, client):
+    ws = client.worksheet_for(NAME)
+    ws.rows[1].append("비고")
+    ws.rows[-1] += ["메모"]
+    store.replace_roster([(NAME, "https://x", None)])
+    _sync(app, api, store, ws)
+    client.gate.reset()
+    _sync(app, api, store, ws)
+    assert client.gate.calls == ["values.batchGet"]
+
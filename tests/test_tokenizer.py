@@ -0,0 +1,68 @@
+from collections import Counter
+
+import pytest
+
+from diary_store import term_counts, tokenize_ko
+
+
+@pytest.mark.parametrize("text, terms", [
+    ("친구에게서 선물을 받았어요", ["친구", "선물"]),
+    ("오늘은 학교에서 축구했어요", ["학교", "축구"]),
+    ("엄마랑 공원에서 놀았다", ["엄마", "공원"]),
+    ("책을 읽었어요", ["책"]),  # 흔한 한 글자 명사는 조사를 떼고 남긴다
+    ("밥이 맛있었다", ["밥", "맛있"]),
+    ("아이가 오이를", ["아이", "오이"]),  # 두 글자 명사의 끝 글자를 조사로 오인하지 않는다
+    ("Minecraft 게임 game", ["minecraft", "게임", "game"]),
+])
+def test_tokenize_strips_particles_and_endings(text, terms):
+    assert tokenize_ko(text) == terms
+
+
+@pytest.mark.parametrize("text", ["자요 많아요 해서", "가요 봐요", "했어요", "고마웠어요 감사해요", "그리고 정말 너무 좋았어요", "", None])
+def test_verb_forms_and_stopwords_yield_no_terms(text):
+    assert tokenize_ko(text) == []
+
+
+def test_term_counts_reads_both_text_columns():
+    records = [{"감사한 일": "친구 친구", "하고 싶은 말": "친구에게 고마워"}, {"감사한 일": None}]
+    assert term_counts(records) == {"친구": 3, "고마워": 1}
+
+
+HEADER = ["날짜", "감정", "감사한 일", "하고 싶은 말", "선생님 쪽지"]
+
+
+def _rec(row, text):
+    return {"날짜": f"2026-03-{row:02d}", "감정": "😀 긍정 - 기쁨", "감사한 일": text, "하고 싶은 말": "", "선생님 쪽지": "", "_row": row}
+
+
+def _synced(store, texts):
+    store.replace_roster([("학생01", "https://docs.google.com/spreadsheets/d/fake-student-01", None)])
+    records = [_rec(i + 3, t) for i, t in enumerate(texts)]
+    store.replace_entries("학생01", 3, records, HEADER, len(records) + 2, list(records[-1].values())[:5])
+    return records
+
+
+def test_appended_rows_add_onto_complete_counts(store):
+    records = _synced(store, ["친구 선물", "친구"])
+    new = [_rec(5, "친구 공원")]
+    store.append_entries("학생01", 5, new, 5, list(new[0].values())[:5])
+    assert store.term_frequencies("학생01") == dict(term_counts(records + new))
+
+
+def test_rules_bump_then_append_recounts_everything(store, monkeypatch):
+    import diary_store
+    with monkeypatch.context() as m:  # 예전 규칙: 띄어쓰기로만 자른다
+        m.setattr(diary_store, "term_counts", lambda recs: Counter(w for rec in recs for w in rec["감사한 일"].split()))
+        records = _synced(store, ["친구에게 선물을", "친구랑"])
+    monkeypatch.setattr(diary_store, "TERM_RULES_VERSION", "bumped")
+    new = [_rec(5, "친구랑 공원에서")]
+    store.append_entries("학생01", 5, new, 5, list(new[0].values())[:5])  # 예전 규칙으로 센 빈도에 더하지 않는다
+    assert store.term_frequencies("학생01") == dict(term_counts(records + new)) == {"친구": 3, "선물": 1, "공원": 1}
+    assert store.conn.execute("SELECT term_rules FROM students").fetchone()[0] == "bumped"
+
+
+def test_database_without_marker_recounts_partial_counts(store):
+    records = _synced(store, ["친구 선물", "친구"])
+    store.conn.execute("UPDATE students SET term_rules=NULL")
+    store.conn.execute("UPDATE term_freq SET count=1")  # 예전 DB의 불완전한 빈도
+    assert store.term_frequencies("학생01") == {"친구": 2, "선물": 1}